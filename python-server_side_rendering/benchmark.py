@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+benchmark.py
+
+Micro-benchmarks for the server-side rendering apps.
+
+Usage:
+  python3 benchmark.py sql [rows] [requests]
+      /products?source=sql&id=N with a fresh sqlite3 connection per request
+      (the old read_sql behaviour) versus the bounded connection pool.
+  python3 benchmark.py static [requests]
+      /, /about and /contact from task_01_jinja.py rendered per request
+      versus served from the pre-rendered page cache (plain and gzip).
+  python3 benchmark.py load [--sizes 1000,10000,...] [--requests N]
+                            [--server] [--output results.json]
+      Generate synthetic products.json/.csv/.db and items.json at each size
+      and drive every route of task_01..task_04 through the Flask test
+      client (and, with --server, a real local HTTP server). Prints
+      throughput and p50/p95/p99 latency per route and data source, and
+      writes the results as JSON so runs can be compared over time. The
+      /products page cache is turned off, so each source is really read.
+"""
+
+import argparse
+import contextlib
+import csv
+import http.client
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import load_products
+import task_01_jinja
+import task_02_logic
+import task_03_files
+import task_04_db
+
+
+def make_products_db(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute("DROP TABLE IF EXISTS Products")
+    conn.execute("CREATE TABLE Products (id INTEGER PRIMARY KEY, name TEXT, "
+                 "category TEXT, price REAL)")
+    conn.executemany("INSERT INTO Products VALUES (?, ?, ?, ?)",
+                     ((i, "Product %d" % i, "Category %d" % (i % 10), i * 0.5)
+                      for i in range(1, rows + 1)))
+    conn.commit()
+    conn.close()
+
+
+def _unpooled_query(path, product_id):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT id, name, category, price FROM Products "
+                            "WHERE id = ?", (product_id,)).fetchall()
+    finally:
+        conn.close()
+
+
+def _rate(func, ids):
+    start = time.perf_counter()
+    for i in ids:
+        func(i)
+    return len(ids) / (time.perf_counter() - start)
+
+
+@contextlib.contextmanager
+def page_cache_disabled():
+    """Turn off task_04_db's /products page cache, so every request does the work."""
+    old = task_04_db.PAGE_CACHE_MAX_BYTES
+    task_04_db.PAGE_CACHE_MAX_BYTES = 0
+    task_04_db._pages.clear()
+    try:
+        yield
+    finally:
+        task_04_db.PAGE_CACHE_MAX_BYTES = old
+
+
+def bench_sql(rows=10000, requests=5000):
+    workdir = tempfile.mkdtemp()
+    old_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        # the page cache would answer the second pass for the same ids
+        with page_cache_disabled():
+            make_products_db("products.db", rows)
+            path = os.path.abspath("products.db")
+            ids = [random.randint(1, rows) for _ in range(requests)]
+            client = task_04_db.app.test_client()
+
+            before = _rate(lambda i: _unpooled_query(path, i), ids)
+            after = _rate(task_04_db.read_sql_product, ids)
+            print("query only:  %8.0f req/s unpooled  %8.0f req/s pooled" % (before, after))
+
+            real_query = task_04_db.read_sql_product
+            task_04_db.read_sql_product = lambda i: [
+                dict(zip(('id', 'name', 'category', 'price'), r))
+                for r in _unpooled_query(path, i)]
+            try:
+                before = _rate(lambda i: client.get("/products?source=sql&id=%d" % i), ids)
+            finally:
+                task_04_db.read_sql_product = real_query
+            after = _rate(lambda i: client.get("/products?source=sql&id=%d" % i), ids)
+            print("full route:  %8.0f req/s unpooled  %8.0f req/s pooled" % (before, after))
+    finally:
+        task_04_db.close_connections()
+        os.chdir(old_cwd)
+        shutil.rmtree(workdir)
+
+
+def bench_static(requests=5000):
+    client = task_01_jinja.app.test_client()
+    paths = ["/", "/about", "/contact"] * (requests // 3)
+    old = task_01_jinja.app.config["PRERENDER_PAGES"]
+    try:
+        task_01_jinja.app.config["PRERENDER_PAGES"] = False
+        rendered = _rate(client.get, paths)
+        task_01_jinja.app.config["PRERENDER_PAGES"] = True
+        cached = _rate(client.get, paths)
+        gzipped = _rate(lambda p: client.get(p, headers={"Accept-Encoding": "gzip"}), paths)
+        # the view alone, without the test client's WSGI round trip
+        with task_01_jinja.app.test_request_context("/"):
+            task_01_jinja.app.config["PRERENDER_PAGES"] = False
+            view_rendered = _rate(lambda _: task_01_jinja.home(), paths)
+            task_01_jinja.app.config["PRERENDER_PAGES"] = True
+            view_cached = _rate(lambda _: task_01_jinja.home(), paths)
+    finally:
+        task_01_jinja.app.config["PRERENDER_PAGES"] = old
+    print("render_template: %8.0f req/s  (view only %8.0f/s)" % (rendered, view_rendered))
+    print("pre-rendered:    %8.0f req/s  (view only %8.0f/s)" % (cached, view_cached))
+    print("pre-rendered gz: %8.0f req/s" % gzipped)
+
+
+def make_synthetic_data(rows):
+    """Write products.json/.csv/.db and items.json with ROWS entries to the cwd."""
+    categories = ["Electronics", "Home Goods", "Books", "Toys", "Garden"]
+    with open("products.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "category", "price"])
+        for i in range(1, rows + 1):
+            writer.writerow([i, "Product %d" % i, categories[i % len(categories)],
+                             round(random.uniform(1, 1000), 2)])
+    # products.json is written row by row so 1M rows do not need a big list
+    with open("products.csv", newline="") as src, open("products.json", "w") as f:
+        f.write("[\n")
+        for n, row in enumerate(csv.DictReader(src)):
+            row["id"] = int(row["id"])
+            row["price"] = float(row["price"])
+            f.write((",\n" if n else "") + json.dumps(row))
+        f.write("\n]\n")
+    load_products.load("products.csv", "products.db")
+    with open("items.json", "w") as f:
+        json.dump({"items": ["Item %d" % i for i in range(rows)]}, f)
+
+
+# Largest catalog for which routes that render every row are benchmarked
+FULL_PAGE_MAX_ROWS = 10000
+
+
+def load_routes(rows):
+    """(app name, flask app, data source, url factory) for each benchmarked route."""
+    def fixed(url):
+        return lambda: url
+
+    def by_id(source):
+        return lambda: "/products?source=%s&id=%d" % (source, random.randint(1, rows))
+
+    routes = [
+        ("task_01_jinja", task_01_jinja.app, "static", fixed("/")),
+        ("task_01_jinja", task_01_jinja.app, "static", fixed("/about")),
+        ("task_01_jinja", task_01_jinja.app, "static", fixed("/contact")),
+    ]
+    if rows <= FULL_PAGE_MAX_ROWS:
+        routes.append(("task_02_logic", task_02_logic.app, "json", fixed("/items")))
+    for source in ("json", "csv"):
+        routes.append(("task_03_files", task_03_files.app, source, by_id(source)))
+    for source in ("json", "csv", "sql"):
+        if rows <= FULL_PAGE_MAX_ROWS:
+            routes.append(("task_04_db", task_04_db.app, source,
+                           fixed("/products?source=%s" % source)))
+        routes.append(("task_04_db", task_04_db.app, source, by_id(source)))
+        routes.append(("task_04_db", task_04_db.app, source,
+                       fixed("/products?source=%s&per_page=50&page=3" % source)))
+        routes.append(("task_04_db", task_04_db.app, source,
+                       fixed("/products?source=%s&category=Books&min_price=100"
+                             "&max_price=200&per_page=50" % source)))
+    return routes
+
+
+def _percentile(sorted_values, p):
+    return sorted_values[int(p * (len(sorted_values) - 1))]
+
+
+def _summary(latencies, elapsed):
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def _drive_test_client(app, make_url, requests):
+    client = app.test_client()
+    client.get(make_url())  # warm the caches, as a running server would be
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        response = client.get(make_url())
+        response.get_data()
+        latencies.append(time.perf_counter() - t0)
+    return _summary(latencies, time.perf_counter() - start)
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def _drive_server(app, make_url, requests):
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=_QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_port)
+    try:
+        latencies = []
+        start = time.perf_counter()
+        for n in range(requests + 1):
+            t0 = time.perf_counter()
+            conn.request("GET", make_url())
+            conn.getresponse().read()
+            if n:  # the first request warms the caches
+                latencies.append(time.perf_counter() - t0)
+            else:
+                start = time.perf_counter()
+        return _summary(latencies, time.perf_counter() - start)
+    finally:
+        conn.close()
+        server.shutdown()
+        server.server_close()
+
+
+def bench_load(sizes=(1000, 10000, 100000, 1000000), requests=500, server=False,
+               output=None):
+    results = []
+    old_cwd = os.getcwd()
+    for rows in sizes:
+        workdir = tempfile.mkdtemp()
+        os.chdir(workdir)
+        try:
+            start = time.perf_counter()
+            make_synthetic_data(rows)
+            print("%d rows: generated data in %.1fs" % (rows, time.perf_counter() - start))
+            modes = [("test_client", _drive_test_client)]
+            if server:
+                modes.append(("server", _drive_server))
+            for app_name, app, source, make_url in load_routes(rows):
+                for mode, drive in modes:
+                    # without the page cache every /products request reads its
+                    # source, instead of all sources timing the same dict lookup
+                    with page_cache_disabled():
+                        stats = drive(app, make_url, requests)
+                    route = re.sub(r"id=\d+", "id={id}", make_url())
+                    stats.update(app=app_name, route=route, source=source, rows=rows,
+                                 mode=mode)
+                    results.append(stats)
+                    print("  %-13s %-11s %-70s %9.1f req/s  p50 %7.2fms  p95 %7.2fms"
+                          "  p99 %7.2fms" % (app_name, mode, route, stats["rps"],
+                                             stats["p50_ms"], stats["p95_ms"],
+                                             stats["p99_ms"]))
+        finally:
+            task_04_db.close_connections()
+            os.chdir(old_cwd)
+            shutil.rmtree(workdir)
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "requests_per_route": requests,
+        "results": results,
+    }
+    output = output or "benchmark-%s.json" % datetime.now().strftime("%Y%m%d-%H%M%S")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Results written to %s" % output)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+    p = sub.add_parser("sql")
+    p.add_argument("rows", type=int, nargs="?", default=10000)
+    p.add_argument("requests", type=int, nargs="?", default=5000)
+    p = sub.add_parser("static")
+    p.add_argument("requests", type=int, nargs="?", default=5000)
+    p = sub.add_parser("load")
+    p.add_argument("--sizes", default="1000,10000,100000,1000000",
+                   help="comma separated catalog sizes")
+    p.add_argument("--requests", type=int, default=500, help="requests per route")
+    p.add_argument("--server", action="store_true", help="also drive a real HTTP server")
+    p.add_argument("--output", help="JSON results file")
+    args = parser.parse_args(argv)
+
+    if args.benchmark == "sql":
+        bench_sql(args.rows, args.requests)
+    elif args.benchmark == "static":
+        bench_static(args.requests)
+    else:
+        sizes = [int(n) for n in args.sizes.split(",")]
+        bench_load(sizes, args.requests, args.server, args.output)
+
+
+if __name__ == "__main__":
+    main()
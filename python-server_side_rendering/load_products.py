@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+load_products.py
+
+Build or refresh products.db (the Products table read by task_04_db.py)
+from products.csv or products.json.
+
+Usage:
+  python3 load_products.py [--db products.db] [--batch 10000] [--upsert] SOURCE
+
+SOURCE is a .csv file with id,name,category,price columns, a .json file
+holding an array of product objects, or a .jsonl file with one product per
+line. Rows are streamed and inserted with executemany() in batches of
+--batch rows, so memory stays bounded whatever the input size.
+
+Without --upsert the database is rebuilt into a temporary file, indexed and
+then moved over --db, so readers never see a half-loaded table. With
+--upsert rows are inserted or updated in place in the existing database.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+from itertools import islice
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS Products (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    category TEXT,
+    price REAL
+)
+"""
+
+# id is the INTEGER PRIMARY KEY (the rowid), so it is already indexed
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_products_category ON Products (category, price)",
+    "CREATE INDEX IF NOT EXISTS idx_products_price ON Products (price)",
+)
+
+INSERT = "INSERT INTO Products (id, name, category, price) VALUES (?, ?, ?, ?)"
+UPSERT = INSERT + (" ON CONFLICT(id) DO UPDATE SET name = excluded.name,"
+                   " category = excluded.category, price = excluded.price")
+
+
+def iter_json_array(f, chunk_size=65536):
+    """Yield the elements of a top-level JSON array one at a time."""
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    expect = "["  # then "first", "element" or ","
+    eof = False
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n":
+            pos += 1
+        if pos < len(buf):
+            char = buf[pos]
+            if expect == "[":
+                if char != "[":
+                    raise ValueError("Expected a JSON array")
+                expect = "first"
+                pos += 1
+                continue
+            # exactly one comma between elements, none before the closing bracket
+            if expect == ",":
+                if char == "]":
+                    return
+                if char != ",":
+                    raise ValueError("Expected ',' or ']' in JSON array")
+                expect = "element"
+                pos += 1
+                continue
+            if char == "]":
+                if expect == "first":
+                    return
+                raise ValueError("Trailing comma in JSON array")
+            if char == ",":
+                raise ValueError("Unexpected ',' in JSON array")
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = None
+            # an element ending at the buffer edge may be a truncated number
+            if end is not None and (end < len(buf) or eof):
+                yield obj
+                pos = end
+                expect = ","
+                continue
+        if eof:
+            raise ValueError("Unterminated JSON array")
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+
+def iter_products(path):
+    """Yield (id, name, category, price) tuples from a csv/json/jsonl file."""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, newline="" if ext == ".csv" else None, encoding="utf-8") as f:
+        if ext == ".csv":
+            rows = csv.DictReader(f)
+        elif ext == ".jsonl":
+            rows = (json.loads(line) for line in f if line.strip())
+        elif ext == ".json":
+            rows = iter_json_array(f)
+        else:
+            raise ValueError("Unsupported source format: %s" % path)
+        for row in rows:
+            yield (int(row["id"]), row["name"], row["category"], float(row["price"]))
+
+
+def load(source, db_path="products.db", batch_size=10000, upsert=False):
+    """Load SOURCE into DB_PATH and return (rows, seconds)."""
+    start = time.perf_counter()
+    target = db_path if upsert else db_path + ".tmp"
+    if not upsert and os.path.exists(target):
+        os.remove(target)
+
+    conn = sqlite3.connect(target, isolation_level=None)
+    try:
+        if upsert:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            statement = UPSERT
+        else:
+            # a fresh file that is only published once complete
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            statement = INSERT
+        conn.execute(SCHEMA)
+        if upsert:
+            for sql in INDEXES:
+                conn.execute(sql)
+
+        rows = 0
+        products = iter_products(source)
+        while True:
+            batch = list(islice(products, batch_size))
+            if not batch:
+                break
+            conn.execute("BEGIN")
+            conn.executemany(statement, batch)
+            conn.execute("COMMIT")
+            rows += len(batch)
+
+        if not upsert:
+            # building the indexes once at the end is cheaper than per row
+            for sql in INDEXES:
+                conn.execute(sql)
+            conn.execute("ANALYZE")
+    except BaseException:
+        conn.close()
+        if not upsert and os.path.exists(target):
+            os.remove(target)
+        raise
+    conn.close()
+
+    if not upsert:
+        os.replace(target, db_path)
+    return rows, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load products into SQLite.")
+    parser.add_argument("source", help="products .csv, .json or .jsonl file")
+    parser.add_argument("--db", default="products.db", help="database file")
+    parser.add_argument("--batch", type=int, default=10000, help="rows per transaction")
+    parser.add_argument("--upsert", action="store_true",
+                        help="insert or update rows in the existing database")
+    args = parser.parse_args(argv)
+
+    try:
+        rows, seconds = load(args.source, args.db, args.batch, args.upsert)
+    except (OSError, ValueError, KeyError, sqlite3.Error) as e:
+        print("Error loading %s: %s" % (args.source, e))
+        return 1
+    rate = rows / seconds if seconds else 0
+    print("Loaded %d rows into %s in %.2fs (%.0f rows/sec)" % (rows, args.db, seconds, rate))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+static_pages.py
+
+Serve templates that take no per-request data from pre-rendered bytes.
+
+When app.config['PRERENDER_PAGES'] is true, serve_page() returns the bytes
+rendered at startup (or on first use) with a precomputed Content-Length, plus
+a gzip copy for clients that accept it. A page is rendered again only when
+its template, or one it includes, changes on disk. Otherwise serve_page()
+is a plain render_template().
+
+Enable it with `python3 task_01_jinja.py --prerender` or by setting
+PRERENDER_PAGES=1 in the environment.
+"""
+
+import gzip
+import os
+import sys
+import threading
+
+from flask import current_app, render_template, request
+from jinja2 import meta
+
+GZIP_MIN_SIZE = 256
+
+# (app, template name) -> page entry
+_pages = {}
+_lock = threading.Lock()
+
+
+def prerender_enabled():
+    return "--prerender" in sys.argv[1:] or os.environ.get("PRERENDER_PAGES") == "1"
+
+
+def _template_files(env, name, seen=None):
+    """Return the file paths of a template and everything it includes."""
+    seen = set() if seen is None else seen
+    if name in seen:
+        return []
+    seen.add(name)
+    source, filename, _ = env.loader.get_source(env, name)
+    files = [filename] if filename else []
+    for ref in meta.find_referenced_templates(env.parse(source)):
+        if ref:
+            files.extend(_template_files(env, ref, seen))
+    return files
+
+
+def _mtimes(files):
+    return tuple(os.stat(f).st_mtime_ns for f in files)
+
+
+def _render(app, name):
+    with app.app_context():
+        body = render_template(name).encode("utf-8")
+        files = _template_files(app.jinja_env, name)
+    entry = {
+        "body": body,
+        "gzip": gzip.compress(body, 9) if len(body) >= GZIP_MIN_SIZE else None,
+        "files": files,
+        "mtimes": _mtimes(files),
+    }
+    with _lock:
+        _pages[(app, name)] = entry
+    return entry
+
+
+def prerender(app, names):
+    """Render NAMES up front, e.g. at startup."""
+    for name in names:
+        _render(app, name)
+
+
+def serve_page(name):
+    app = current_app._get_current_object()
+    if not app.config.get("PRERENDER_PAGES"):
+        return render_template(name)
+
+    entry = _pages.get((app, name))
+    if entry is None:
+        entry = _render(app, name)
+    elif _mtimes(entry["files"]) != entry["mtimes"]:
+        # Jinja only reloads changed templates itself in debug mode
+        if app.jinja_env.cache is not None:
+            app.jinja_env.cache.clear()
+        entry = _render(app, name)
+
+    headers = {"Content-Type": "text/html; charset=utf-8", "Vary": "Accept-Encoding"}
+    body = entry["body"]
+    if entry["gzip"] is not None and request.accept_encodings["gzip"]:
+        body = entry["gzip"]
+        headers["Content-Encoding"] = "gzip"
+    headers["Content-Length"] = str(len(body))
+    return app.response_class(body, headers=headers)
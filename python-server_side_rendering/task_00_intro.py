@@ -1,7 +1,160 @@
+import csv
+import json
 import os
+import re
+import zipfile
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 
-def generate_invitations(template, attendees):
-    """Generate invitation files based on a template and attendee list."""
+PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+# The names filled unless generate_invitations() is given placeholders
+DEFAULT_PLACEHOLDERS = ("name", "event_title", "event_date", "event_location")
+
+
+class CompiledTemplate:
+    """A template parsed once into literal text and placeholder slots."""
+
+    def __init__(self, template, placeholders=DEFAULT_PLACEHOLDERS):
+        # re.split keeps the captured names at the odd positions
+        parts = PLACEHOLDER.split(template)
+        self.fields = []
+        self.slots = []
+        index = {}
+        for pos in range(1, len(parts), 2):
+            name = parts[pos]
+            if name not in placeholders:
+                # not a placeholder we fill: keep the text as it was
+                parts[pos] = "{" + name + "}"
+                continue
+            if name not in index:
+                index[name] = len(self.fields)
+                self.fields.append(name)
+            self.slots.append((pos, index[name]))
+        self.parts = parts
+
+    def render(self, values):
+        """Fill the template from a dict, using "N/A" for missing values."""
+        filled = [str(values.get(name) or "N/A") for name in self.fields]
+        pieces = self.parts[:]
+        for pos, i in self.slots:
+            pieces[pos] = filled[i]
+        return "".join(pieces)
+
+
+def _write_batch(batch):
+    """Write (filename, text) pairs and return the filenames that failed."""
+    failed = []
+    for filename, text in batch:
+        try:
+            with open(filename, "w") as f:
+                f.write(text)
+        except Exception as e:
+            print(f"Error writing file {filename}: {e}")
+            failed.append(filename)
+    return failed
+
+
+class _FileWriter:
+    """One file per invitation, written in batches by a thread pool."""
+
+    def __init__(self, output_dir, workers, batch_size):
+        self.output_dir = output_dir
+        self.workers = workers
+        self.batch_size = batch_size
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.pending = []
+        self.batch = []
+        self.written = 0
+        self.errors = 0
+
+    def add(self, name, text):
+        self.batch.append((os.path.join(self.output_dir, name), text))
+        if len(self.batch) >= self.batch_size:
+            self.pending.append((len(self.batch), self.pool.submit(_write_batch, self.batch)))
+            self.batch = []
+        # keep at most a few batches in flight
+        while len(self.pending) > self.workers * 2:
+            self._collect()
+
+    def _collect(self):
+        count, future = self.pending.pop(0)
+        failed = len(future.result())
+        self.written += count - failed
+        self.errors += failed
+
+    def close(self):
+        if self.batch:
+            self.pending.append((len(self.batch), self.pool.submit(_write_batch, self.batch)))
+            self.batch = []
+        while self.pending:
+            self._collect()
+        self.pool.shutdown()
+
+
+class _ZipWriter:
+    """All invitations as members of one zip archive."""
+
+    def __init__(self, path):
+        self.archive = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+        self.written = 0
+        self.errors = 0
+
+    def add(self, name, text):
+        self.archive.writestr(name, text)
+        self.written += 1
+
+    def close(self):
+        self.archive.close()
+
+
+class _ConcatWriter:
+    """All invitations appended to one text file, separated by separator."""
+
+    def __init__(self, path, separator):
+        self.file = open(path, "w")
+        self.separator = separator
+        self.written = 0
+        self.errors = 0
+
+    def add(self, name, text):
+        if self.written:
+            self.file.write(self.separator)
+        self.file.write(text)
+        self.written += 1
+
+    def close(self):
+        self.file.close()
+
+
+def read_attendees(path):
+    """Lazily yield attendee dicts from a .csv or .jsonl (JSON lines) file."""
+    with open(path, newline="") as f:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def generate_invitations(template, attendees, placeholders=None, output_dir=".",
+                         output_file=None, separator="\n", workers=4, batch_size=500,
+                         progress_every=10000):
+    """Generate invitation files based on a template and attendee records.
+
+    attendees may be a list or any iterable (e.g. read_attendees()); records
+    are validated and written one at a time as they arrive. Every
+    {name}, {event_title}, {event_date} and {event_location} placeholder is
+    filled from the attendee's value of the same name ("N/A" when missing);
+    pass placeholders to fill a different set of names. Any other text in
+    braces is left as it is.
+
+    By default each invitation goes to output_<n>.txt in output_dir, written
+    in batches by a thread pool. With output_file ending in .zip they are
+    stored as output_<n>.txt members of that archive instead; any other
+    output_file gets all invitations concatenated, separated by separator.
+    """
 
     # ---------------------------------------------------
     # 1. INPUT TYPE CHECK
@@ -9,8 +162,8 @@ def generate_invitations(template, attendees):
     if not isinstance(template, str):
         print("Error: Template must be a string.")
         return
-    
-    if not isinstance(attendees, list) or not all(isinstance(x, dict) for x in attendees):
+
+    if isinstance(attendees, (str, bytes, dict)) or not isinstance(attendees, Iterable):
         print("Error: Attendees must be a list of dictionaries.")
         return
 
@@ -21,45 +174,54 @@ def generate_invitations(template, attendees):
         print("Template is empty, no output files generated.")
         return
 
-    # ---------------------------------------------------
-    # 3. EMPTY LIST CHECK
-    # ---------------------------------------------------
-    if len(attendees) == 0:
-        print("No data provided, no output files generated.")
-        return
+    # Template-i bir dəfə emal edirik
+    compiled = CompiledTemplate(template, placeholders or DEFAULT_PLACEHOLDERS)
+
+    if output_file is None:
+        writer = _FileWriter(output_dir, workers, batch_size)
+    elif output_file.endswith(".zip"):
+        writer = _ZipWriter(output_file)
+    else:
+        writer = _ConcatWriter(output_file, separator)
 
     # ---------------------------------------------------
-    # 4. PROCESS EACH ATTENDEE
+    # 3. PROCESS EACH ATTENDEE AS IT ARRIVES
     # ---------------------------------------------------
-    for index, attendee in enumerate(attendees, start=1):
+    seen = 0
+    errors = 0
+    try:
+        for index, attendee in enumerate(attendees, start=1):
+            seen = index
+            if not isinstance(attendee, dict):
+                print(f"Error: attendee #{index} is not a dictionary, skipped.")
+                errors += 1
+                continue
 
-        # Hər placeholder üçün "N/A" fallback veririk
-        name = attendee.get("name") or "N/A"
-        event_title = attendee.get("event_title") or "N/A"
-        event_date = attendee.get("event_date") or "N/A"
-        event_location = attendee.get("event_location") or "N/A"
+            try:
+                output_text = compiled.render(attendee)
+            except Exception as e:
+                print(f"Error processing attendee #{index}: {e}")
+                errors += 1
+                continue
 
-        # Template-i emal edirik
-        try:
-            output_text = (
-                template.replace("{name}", name)
-                        .replace("{event_title}", event_title)
-                        .replace("{event_date}", str(event_date))
-                        .replace("{event_location}", event_location)
-            )
-        except Exception as e:
-            print(f"Error processing attendee #{index}: {e}")
-            continue
+            writer.add(f"output_{index}.txt", output_text)
+            if progress_every and index % progress_every == 0:
+                print(f"Processed {index} attendees...")
+    finally:
+        writer.close()
 
-        # ---------------------------------------------------
-        # 5. WRITE OUTPUT FILE
-        # ---------------------------------------------------
-        output_filename = f"output_{index}.txt"
+    # ---------------------------------------------------
+    # 4. EMPTY INPUT CHECK
+    # ---------------------------------------------------
+    if seen == 0:
+        if output_file is not None:
+            os.remove(output_file)
+        print("No data provided, no output files generated.")
+        return
 
-        try:
-            with open(output_filename, "w") as f:
-                f.write(output_text)
-            print(f"Generated: {output_filename}")
-        except Exception as e:
-            print(f"Error writing file {output_filename}: {e}")
-            continue
+    # ---------------------------------------------------
+    # 5. SUMMARY
+    # ---------------------------------------------------
+    target = output_file or "files"
+    print(f"Generated {writer.written} invitations to {target} "
+          f"({errors + writer.errors} errors).")
@@ -1,18 +1,22 @@
-from flask import Flask, render_template
+from flask import Flask
+from static_pages import prerender, prerender_enabled, serve_page
 
 app = Flask(__name__)
+app.config['PRERENDER_PAGES'] = prerender_enabled()
 
 @app.route('/')
 def home():
-    return render_template('index.html')
+    return serve_page('index.html')
 
 @app.route('/about')
 def about():
-    return render_template('about.html')
+    return serve_page('about.html')
 
 @app.route('/contact')
 def contact():
-    return render_template('contact.html')
+    return serve_page('contact.html')
 
 if __name__ == '__main__':
+    if app.config['PRERENDER_PAGES']:
+        prerender(app, ['index.html', 'about.html', 'contact.html'])
     app.run(debug=True, port=5000)
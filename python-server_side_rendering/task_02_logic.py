@@ -1,22 +1,62 @@
-from flask import Flask, render_template
+from flask import Flask, render_template, request
+from datetime import datetime, timezone
+import hashlib
 import json
+import os
+from static_pages import prerender, prerender_enabled, serve_page
 
 app = Flask(__name__)
+app.config['PRERENDER_PAGES'] = prerender_enabled()
+
+# (etag, rendered page) of the last /items response
+_items_page = (None, None)
 
 @app.route('/')
 def home():
-    return render_template('index.html')
+    return serve_page('index.html')
+
+def items_version():
+    st = os.stat('items.json')
+    return (st.st_mtime_ns, st.st_size)
 
 @app.route('/items')
 def items():
-    # JSON faylından məlumatları oxu
-    with open('items.json') as f:
-        data = json.load(f)
-    
-    items_list = data.get("items", [])
+    global _items_page
+
+    # ETag from the data version and query string; unchanged data -> 304
+    version = items_version()
+    etag = hashlib.sha1(repr((version, request.query_string)).encode()).hexdigest()
+    last_modified = datetime.fromtimestamp(version[0] // 10**9, timezone.utc)
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    elif request.if_modified_since:
+        not_modified = last_modified <= request.if_modified_since
+    else:
+        not_modified = False
+
+    if not_modified:
+        response = app.response_class(status=304)
+    elif _items_page[0] == etag:
+        response = app.response_class(_items_page[1])
+    else:
+        # JSON faylından məlumatları oxu
+        with open('items.json') as f:
+            data = json.load(f)
+
+        items_list = data.get("items", [])
+
+        # template-ə ötür
+        page = render_template('items.html', items=items_list)
+        _items_page = (etag, page)
+        response = app.response_class(page)
 
-    # template-ə ötür
-    return render_template('items.html', items=items_list)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 if __name__ == '__main__':
+    if app.config['PRERENDER_PAGES']:
+        prerender(app, ['index.html'])
     app.run(debug=True)
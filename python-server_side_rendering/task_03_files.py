@@ -1,16 +1,20 @@
 from flask import Flask, render_template, request
 import json
 import csv
+import os
 
 app = Flask(__name__)
 
-def read_json():
-    with open('products.json') as f:
+# path -> ((mtime, size), {'products': [...], 'by_id': {...}})
+_datasets = {}
+
+def _load_json(path):
+    with open(path) as f:
         return json.load(f)
 
-def read_csv():
+def _load_csv(path):
     products = []
-    with open('products.csv') as f:
+    with open(path) as f:
         reader = csv.DictReader(f)
         for row in reader:
             # CSV-dən oxunan qiymətləri float-a çeviririk
@@ -19,6 +23,26 @@ def read_csv():
             products.append(row)
     return products
 
+def load_dataset(path, loader):
+    # Re-read the file (and rebuild the id index) only when it changes
+    st = os.stat(path)
+    version = (st.st_mtime_ns, st.st_size)
+    entry = _datasets.get(path)
+    if entry is None or entry[0] != version:
+        products = loader(path)
+        by_id = {}
+        for p in products:
+            by_id.setdefault(p['id'], p)
+        entry = (version, {'products': products, 'by_id': by_id})
+        _datasets[path] = entry
+    return entry[1]
+
+def read_json():
+    return load_dataset('products.json', _load_json)['products']
+
+def read_csv():
+    return load_dataset('products.csv', _load_csv)['products']
+
 @app.route('/products')
 def products():
     source = request.args.get('source')
@@ -26,17 +50,18 @@ def products():
     error = None
 
     if source == 'json':
-        data = read_json()
+        dataset = load_dataset('products.json', _load_json)
     elif source == 'csv':
-        data = read_csv()
+        dataset = load_dataset('products.csv', _load_csv)
     else:
         return render_template('product_display.html', error="Wrong source", products=[])
+    data = dataset['products']
 
     if product_id:
-        filtered = [p for p in data if p['id'] == product_id]
-        if not filtered:
+        product = dataset['by_id'].get(product_id)
+        if product is None:
             return render_template('product_display.html', error="Product not found", products=[])
-        data = filtered
+        data = [product]
 
     return render_template('product_display.html', products=data, error=None)
 
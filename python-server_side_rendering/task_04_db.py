@@ -1,17 +1,71 @@
-from flask import Flask, render_template, request
+from flask import Flask, make_response, render_template, request, stream_template, url_for
+import bisect
+import hashlib
 import json
 import csv
+import os
 import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from urllib.request import pathname2url
 
 app = Flask(__name__)
 
-def read_json():
-    with open('products.json') as f:
+# Parsed data sources, keyed by absolute path -> ((mtime, size), products).
+# An entry is reused until the file's mtime or size changes.
+CACHE_MAX_ENTRIES = 8
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+cache_stats = {'hits': 0, 'misses': 0, 'reloads': 0}
+
+def _file_version(path):
+    st = os.stat(path)
+    version = (st.st_mtime_ns, st.st_size)
+    # In WAL mode SQLite writes land in the -wal file first
+    wal = path + '-wal'
+    if os.path.exists(wal):
+        wst = os.stat(wal)
+        version += (wst.st_mtime_ns, wst.st_size)
+    return version
+
+def cached_load(path, loader):
+    key = os.path.abspath(path)
+    version = _file_version(key)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] == version:
+            _cache.move_to_end(key)
+            cache_stats['hits'] += 1
+            return entry[1]
+    data = loader(key)
+    if data is None:
+        return None
+    with _cache_lock:
+        if key in _cache:
+            cache_stats['reloads'] += 1
+        else:
+            cache_stats['misses'] += 1
+        _cache[key] = (version, data)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return data
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+        for k in cache_stats:
+            cache_stats[k] = 0
+
+def _load_json(path):
+    with open(path) as f:
         return json.load(f)
 
-def read_csv():
+def _load_csv(path):
     products = []
-    with open('products.csv') as f:
+    with open(path) as f:
         reader = csv.DictReader(f)
         for row in reader:
             row['id'] = int(row['id'])
@@ -19,12 +73,81 @@ def read_csv():
             products.append(row)
     return products
 
-def read_sql():
+# SQLite connections live in a small pool per database. A query borrows one
+# and hands it back as soon as its rows are fetched, so the number of open
+# connections stays bounded however many threads the server starts (werkzeug
+# runs each request on a new thread). sqlite3 keeps a per-connection cache of
+# prepared statements, so repeated queries skip re-parsing too.
+SQLITE_READ_ONLY = True
+SQLITE_PRAGMAS = {'mmap_size': 256 * 1024 * 1024, 'cache_size': -16000}
+SQLITE_CACHED_STATEMENTS = 64
+SQLITE_POOL_SIZE = 8
+_pools = {}  # absolute path -> (inode, [idle connections])
+_pools_lock = threading.Lock()
+_generation = 0
+
+def _connect(path):
+    if SQLITE_READ_ONLY:
+        conn = sqlite3.connect('file:%s?mode=ro' % pathname2url(path), uri=True,
+                               check_same_thread=False,
+                               cached_statements=SQLITE_CACHED_STATEMENTS)
+    else:
+        conn = sqlite3.connect(path, check_same_thread=False,
+                               cached_statements=SQLITE_CACHED_STATEMENTS)
+        conn.execute("PRAGMA journal_mode=WAL")
+    for name, value in SQLITE_PRAGMAS.items():
+        conn.execute("PRAGMA %s=%d" % (name, value))
+    return conn
+
+@contextmanager
+def connection(path):
+    """Borrow a pooled connection to path; it is closed instead if the query fails."""
+    key = os.path.abspath(path)
+    inode = os.stat(key).st_ino
+    stale = []
+    conn = None
+    with _pools_lock:
+        entry = _pools.get(key)
+        if entry is None or entry[0] != inode:
+            # A replaced database file (new inode) needs new connections
+            if entry is not None:
+                stale = entry[1]
+            entry = _pools[key] = (inode, [])
+        if entry[1]:
+            conn = entry[1].pop()
+        generation = _generation
+    for old in stale:
+        old.close()
+    if conn is None:
+        conn = _connect(key)
     try:
-        conn = sqlite3.connect('products.db')
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name, category, price FROM Products")
-        rows = cursor.fetchall()
+        yield conn
+    except BaseException:
+        conn.close()
+        raise
+    with _pools_lock:
+        entry = _pools.get(key)
+        if (generation == _generation and entry is not None and entry[0] == inode
+                and len(entry[1]) < SQLITE_POOL_SIZE):
+            entry[1].append(conn)
+            conn = None
+    if conn is not None:
+        conn.close()
+
+def close_connections():
+    """Close every idle connection; borrowed ones are closed when returned."""
+    global _generation
+    with _pools_lock:
+        conns = [conn for _, idle in _pools.values() for conn in idle]
+        _pools.clear()
+        _generation += 1
+    for conn in conns:
+        conn.close()
+
+def _query_sql(path, query, params=()):
+    try:
+        with connection(path) as conn:
+            rows = conn.execute(query, params).fetchall()
         products = []
         for r in rows:
             products.append({
@@ -34,36 +157,318 @@ def read_sql():
                 'price': r[3]
             })
         return products
-    except sqlite3.Error as e:
+    except (sqlite3.Error, OSError) as e:
+        # connection() has closed the failed connection rather than pooling it
         print("Database error:", e)
         return None
-    finally:
-        conn.close()
+
+def _load_sql(path):
+    return _query_sql(path, "SELECT id, name, category, price FROM Products")
+
+def build_dataset(products):
+    # id -> product index, built once per (re)load of the source
+    by_id = {}
+    for p in products:
+        by_id.setdefault(p['id'], p)
+    # id-ordered view used for page/keyset pagination
+    ordered = sorted(products, key=lambda p: p['id'])
+    ids = [p['id'] for p in ordered]
+    # price-sorted view for range queries, and the same per category
+    by_price = sorted(products, key=lambda p: p['price'])
+    prices = [p['price'] for p in by_price]
+    by_category = {}
+    for p in by_price:
+        entry = by_category.setdefault(p['category'], ([], []))
+        entry[0].append(p['price'])
+        entry[1].append(p)
+    return {'products': products, 'by_id': by_id, 'ordered': ordered, 'ids': ids,
+            'by_price': by_price, 'prices': prices, 'by_category': by_category}
+
+def _indexed(loader):
+    def load(path):
+        products = loader(path)
+        if products is None:
+            return None
+        return build_dataset(products)
+    return load
+
+SOURCES = {
+    'json': ('products.json', _indexed(_load_json)),
+    'csv': ('products.csv', _indexed(_load_csv)),
+    'sql': ('products.db', _indexed(_load_sql)),
+}
+
+def load_dataset(source):
+    path, loader = SOURCES[source]
+    if source != 'sql':
+        return cached_load(path, loader)
+    try:
+        return cached_load(path, loader)
+    except OSError as e:
+        print("Database error:", e)
+        return None
+
+def read_json():
+    return load_dataset('json')['products']
+
+def read_csv():
+    return load_dataset('csv')['products']
+
+def read_sql():
+    dataset = load_dataset('sql')
+    return None if dataset is None else dataset['products']
+
+def read_sql_product(product_id):
+    return _query_sql(SOURCES['sql'][0],
+                      "SELECT id, name, category, price FROM Products WHERE id = ?",
+                      (product_id,))
+
+def read_sql_page(limit, offset=0, after_id=None):
+    if after_id is not None:
+        return _query_sql(SOURCES['sql'][0],
+                          "SELECT id, name, category, price FROM Products "
+                          "WHERE id > ? ORDER BY id LIMIT ?",
+                          (after_id, limit))
+    return _query_sql(SOURCES['sql'][0],
+                      "SELECT id, name, category, price FROM Products "
+                      "ORDER BY id LIMIT ? OFFSET ?",
+                      (limit, offset))
+
+def _price_range(prices, min_price, max_price):
+    lo = 0 if min_price is None else bisect.bisect_left(prices, min_price)
+    hi = len(prices) if max_price is None else bisect.bisect_right(prices, max_price)
+    return lo, max(lo, hi)
+
+def filter_dataset(dataset, category=None, min_price=None, max_price=None):
+    # Returns (products ordered by price, name of the index used)
+    if category is not None:
+        prices, items = dataset['by_category'].get(category, ([], []))
+        index_path = 'category'
+    else:
+        prices, items = dataset['prices'], dataset['by_price']
+        index_path = None
+    if min_price is not None or max_price is not None:
+        lo, hi = _price_range(prices, min_price, max_price)
+        items = items[lo:hi]
+        index_path = 'category+price' if index_path else 'price'
+    return items, index_path
+
+def read_sql_filtered(category=None, min_price=None, max_price=None, limit=-1, offset=0):
+    where = []
+    params = []
+    if category is not None:
+        where.append("category = ?")
+        params.append(category)
+    if min_price is not None:
+        where.append("price >= ?")
+        params.append(min_price)
+    if max_price is not None:
+        where.append("price <= ?")
+        params.append(max_price)
+    query = ("SELECT id, name, category, price FROM Products WHERE " + " AND ".join(where) +
+             " ORDER BY price, id LIMIT ? OFFSET ?")
+    data = _query_sql(SOURCES['sql'][0], query, params + [limit, offset])
+    return data, 'sql:' + sql_plan(query, len(params) + 2)
+
+# query -> plan text; the plans only change when the schema/indexes do
+_plans = {}
+
+def sql_plan(query, nparams):
+    path = os.path.abspath(SOURCES['sql'][0])
+    try:
+        key = (query, _file_version(path))
+    except OSError:
+        return 'unavailable'
+    plan = _plans.get(key)
+    if plan is None:
+        try:
+            with connection(path) as conn:
+                rows = conn.execute("EXPLAIN QUERY PLAN " + query,
+                                    (None,) * nparams).fetchall()
+        except (sqlite3.Error, OSError):
+            return 'unavailable'
+        plan = '; '.join(r[-1] for r in rows)
+        if len(_plans) > 64:
+            _plans.clear()
+        _plans[key] = plan
+    return plan
+
+def paginate(items, limit, offset=0, ids=None, after_id=None):
+    if after_id is not None:
+        offset = bisect.bisect_right(ids, after_id)
+    return items[offset:offset + limit]
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 1000
+
+def render_products(products, error=None, stream=False, next_url=None, index_path=None,
+                    status=200):
+    if stream:
+        # Rows are rendered and sent as the template yields them
+        response = app.response_class(stream_template(
+            'product_display.html', products=products, error=error, next_url=next_url))
+    else:
+        response = make_response(render_template(
+            'product_display.html', products=products, error=error, next_url=next_url))
+    if index_path:
+        response.headers['X-Index-Path'] = index_path
+    response.status_code = status
+    return response
+
+def _database_error(stream):
+    # Usually transient (e.g. "database is locked"), so never cached
+    return render_products([], error="Database error", stream=stream, status=503)
+
+def _next_url(**changes):
+    args = request.args.to_dict()
+    args.update(changes)
+    return url_for('products', **args)
+
+# Rendered /products pages keyed by ETag, bounded by total body size
+PAGE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+_pages = OrderedDict()
+_pages_lock = threading.Lock()
+_pages_size = 0
+
+def _page_cache_get(etag):
+    with _pages_lock:
+        entry = _pages.get(etag)
+        if entry is not None:
+            _pages.move_to_end(etag)
+        return entry
+
+def _page_cache_put(etag, body, headers):
+    global _pages_size
+    if len(body) > PAGE_CACHE_MAX_BYTES // 4:
+        return
+    with _pages_lock:
+        if etag in _pages:
+            return
+        _pages[etag] = (body, headers)
+        _pages_size += len(body)
+        while _pages_size > PAGE_CACHE_MAX_BYTES:
+            _, (old, _) = _pages.popitem(last=False)
+            _pages_size -= len(old)
+
+def source_version(source):
+    try:
+        return _file_version(os.path.abspath(SOURCES[source][0]))
+    except OSError:
+        return None
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since:
+        return last_modified <= request.if_modified_since
+    return False
 
 @app.route('/products')
 def products():
+    source = request.args.get('source')
+    version = source_version(source) if source in SOURCES else None
+    if version is None:
+        return products_page()
+
+    # The page only depends on the source file and the query string
+    etag = hashlib.sha1(repr((source, version, sorted(request.args.items(multi=True))))
+                        .encode()).hexdigest()
+    last_modified = datetime.fromtimestamp(version[0] // 10**9, timezone.utc)
+    if _not_modified(etag, last_modified):
+        response = app.response_class(status=304)
+    else:
+        cached = _page_cache_get(etag)
+        if cached is not None:
+            response = app.response_class(cached[0], headers=cached[1])
+        else:
+            response = products_page()
+            if response.status_code != 200:
+                # error pages get no validators, so they are neither cached
+                # here nor revalidated into a 304 by the client
+                return response
+            if not response.is_streamed:
+                headers = [(k, v) for k, v in response.headers.items()
+                           if k in ('Content-Type', 'X-Index-Path')]
+                _page_cache_put(etag, response.get_data(), headers)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def products_page():
     source = request.args.get('source')
     product_id = request.args.get('id', type=int)
+    category = request.args.get('category')
+    min_price = request.args.get('min_price', type=float)
+    max_price = request.args.get('max_price', type=float)
+    page = request.args.get('page', type=int)
+    per_page = request.args.get('per_page', type=int)
+    after_id = request.args.get('after_id', type=int)
+    stream = request.args.get('stream') in ('1', 'true')
     error = None
 
-    if source == 'json':
-        data = read_json()
-    elif source == 'csv':
-        data = read_csv()
-    elif source == 'sql':
-        data = read_sql()
+    if source not in SOURCES:
+        return render_products([], error="Wrong source", stream=stream)
+
+    if product_id and source == 'sql':
+        data = read_sql_product(product_id)
         if data is None:
-            return render_template('product_display.html', error="Database error", products=[])
-    else:
-        return render_template('product_display.html', error="Wrong source", products=[])
+            return _database_error(stream)
+        if not data:
+            return render_products([], error="Product not found", stream=stream)
+        return render_products(data, stream=stream, index_path='sql:primary key')
+
+    filtered = category is not None or min_price is not None or max_price is not None
+    paginated = page is not None or per_page is not None or after_id is not None
+    if (filtered or paginated) and not product_id:
+        index_path = None
+        if paginated:
+            per_page = min(max(per_page or DEFAULT_PER_PAGE, 1), MAX_PER_PAGE)
+            page = max(page or 1, 1)
+            # Fetch one extra row to know whether there is a next page
+            limit, offset = per_page + 1, (page - 1) * per_page
+        else:
+            limit, offset = -1, 0
+        if source == 'sql':
+            if filtered:
+                data, index_path = read_sql_filtered(category, min_price, max_price,
+                                                     limit, offset)
+            else:
+                data = read_sql_page(limit, offset, after_id)
+            if data is None:
+                return _database_error(stream)
+        else:
+            dataset = load_dataset(source)
+            if filtered:
+                # Filtered results are ordered by price, so only page/per_page apply
+                data, index_path = filter_dataset(dataset, category, min_price, max_price)
+                if paginated:
+                    data = paginate(data, limit, offset)
+            else:
+                data = paginate(dataset['ordered'], limit, offset, dataset['ids'], after_id)
+        next_url = None
+        if paginated and len(data) > per_page:
+            data = data[:per_page]
+            if after_id is not None and not filtered:
+                next_url = _next_url(after_id=data[-1]['id'])
+            else:
+                next_url = _next_url(page=page + 1)
+        return render_products(data, stream=stream, next_url=next_url, index_path=index_path)
+
+    dataset = load_dataset(source)
+    if dataset is None:
+        return _database_error(stream)
+    data = dataset['products']
+    index_path = None
 
     if product_id:
-        filtered = [p for p in data if p['id'] == product_id]
-        if not filtered:
-            return render_template('product_display.html', error="Product not found", products=[])
-        data = filtered
+        product = dataset['by_id'].get(product_id)
+        if product is None:
+            return render_products([], error="Product not found", stream=stream)
+        data = [product]
+        index_path = 'id'
 
-    return render_template('product_display.html', products=data, error=None)
+    return render_products(data, stream=stream, index_path=index_path)
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+"""
+benchmark.py
+
+Benchmarks for the restful-api servers.
+
+Usage:
+  python3 benchmark.py http [--requests N] [--clients 1,8,64]
+      Requests/sec of task_03_http_server.py in each serving mode
+      (single, threaded, pool; with and without keep-alive; asyncio) for 1, 8 and 64
+      concurrent clients. The server runs in its own process.
+  python3 benchmark.py connections [--counts 100,1000,5000]
+      Open that many idle keep-alive connections against the threaded and
+      the asyncio engine, then report server memory per connection and how
+      many connections still get answered.
+  python3 benchmark.py prefork [--processes 1,2,4,8,16] [--requests N]
+      Requests/sec of run_prefork() as the number of worker processes grows,
+      driven by several client processes with 64 keep-alive clients in all.
+      Scaling is bounded by the number of CPU cores on the machine.
+  python3 benchmark.py metrics [--requests N]
+      Per-request cost of the /metrics instrumentation: Metrics.observe()
+      on its own, task_03_http_server.py req/s and task_04_flask.py (test
+      client) req/s with the instrumentation enabled and disabled.
+  python3 benchmark.py users [--threads 1,4,16] [--adds N] [--recover N]
+      Concurrent add_user throughput of task_04_flask.py (test client) and of
+      UserStore.add() alone, in memory and with an on-disk log, then the time
+      to reopen a store of --recover users (try 10000000 for 10M).
+  python3 benchmark.py basic-auth [--requests N]
+      Authenticated /basic-protected req/s of task_05_basic_security.py
+      (test client) with the verified-credential cache disabled and enabled.
+  python3 benchmark.py login [--seconds S] [--logins 4] [--others 4]
+      task_05_basic_security.py on a real threaded server, with password
+      hashing inline (KDF_WORKERS=0) and in the process pool. --logins
+      clients keep POSTing /login while --others clients call
+      /jwt-protected; prints p50/p95 latency of both and 503 counts.
+  python3 benchmark.py jwt [--tokens N]
+      CPU per request spent on JWT decoding in task_05_basic_security.py for
+      N distinct tokens, uncached and from the claims cache: the decode step
+      alone and full /admin-only requests (test client).
+"""
+
+import argparse
+import asyncio
+import http.client
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+
+import task_03_http_server
+
+PATHS = ["/", "/status", "/data", "/info"]
+
+
+def _serve(port_queue, options):
+    options = dict(options)
+    options.pop("engine", None)
+    task_03_http_server.METRICS.enabled = options.pop("metrics", True)
+    httpd = task_03_http_server.make_server("127.0.0.1", 0, **options)
+    # clients hanging up at the end of a run are expected
+    httpd.handle_error = lambda request, client_address: None
+    port_queue.put(httpd.server_address[1])
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+
+
+def _serve_async(port_queue, options):
+    async def main():
+        server = await task_03_http_server.start_async_server("127.0.0.1", 0)
+        port_queue.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+    asyncio.run(main())
+
+
+def start_server(engine="stdlib", **options):
+    """Run a task_03 server in a child process; return (process, port)."""
+    ports = multiprocessing.Queue()
+    target = _serve_async if engine == "asyncio" else _serve
+    process = multiprocessing.Process(target=target, args=(ports, options), daemon=True)
+    process.start()
+    return process, ports.get(timeout=10)
+
+
+def _client(port, requests, errors):
+    # http.client reconnects by itself when the server closes the connection
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        for n in range(requests):
+            conn.request("GET", PATHS[n % len(PATHS)])
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+    except (OSError, http.client.HTTPException) as e:
+        errors.append(e)
+    finally:
+        conn.close()
+
+
+def drive(port, clients, requests):
+    """Send `requests` requests from `clients` threads; return requests/sec."""
+    errors = []
+    per_client = max(requests // clients, 1)
+    threads = [threading.Thread(target=_client, args=(port, per_client, errors))
+               for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return per_client * clients / elapsed, len(errors)
+
+
+HTTP_MODES = [
+    ("single", dict(concurrency="single")),
+    ("threaded", dict(concurrency="threaded")),
+    ("threaded+keepalive", dict(concurrency="threaded", keep_alive=True)),
+    ("pool(16)", dict(concurrency="pool", workers=16)),
+    ("pool(16)+keepalive", dict(concurrency="pool", workers=16, keep_alive=True)),
+    ("asyncio", dict(engine="asyncio")),
+]
+
+
+def bench_http(requests=4000, clients=(1, 8, 64), modes=HTTP_MODES):
+    print("%-22s" % "mode" + "".join("%14s" % ("%d clients" % c) for c in clients))
+    for name, options in modes:
+        process, port = start_server(**options)
+        try:
+            row = []
+            for c in clients:
+                rate, errors = drive(port, c, requests)
+                row.append("%10.0f/s%s" % (rate, "!" if errors else " "))
+            print("%-22s" % name + "".join("%14s" % r for r in row))
+        finally:
+            process.terminate()
+            process.join()
+    print("(! = some requests failed)")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _client_process(port, clients, requests, results):
+    results.put(drive(port, clients, requests))
+
+
+def drive_processes(port, processes, clients, requests):
+    """Like drive(), but spread over several client processes."""
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=_client_process,
+                                     args=(port, clients // processes,
+                                           requests // processes, results))
+             for _ in range(processes)]
+    for proc in procs:
+        proc.start()
+    rates = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    return sum(r for r, _ in rates), sum(e for _, e in rates)
+
+
+def bench_prefork(process_counts=(1, 2, 4, 8, 16), requests=20000, clients=64):
+    print("CPU cores: %d" % (os.cpu_count() or 1))
+    print("%10s %12s %9s" % ("processes", "req/s", "speedup"))
+    baseline = None
+    for count in process_counts:
+        port = _free_port()
+        server = multiprocessing.Process(
+            target=task_03_http_server.run_prefork,
+            kwargs=dict(processes=count, host="127.0.0.1", port=port,
+                        concurrency="threaded", keep_alive=True))
+        server.start()
+        try:
+            time.sleep(0.5 + 0.05 * count)
+            client_procs = max(1, min(8, os.cpu_count() or 1))
+            rate, errors = drive_processes(port, client_procs, clients, requests)
+            baseline = baseline or rate
+            print("%10d %10.0f/s %8.2fx%s" % (count, rate, rate / baseline,
+                                              "  (%d errors)" % errors if errors else ""))
+        finally:
+            os.kill(server.pid, signal.SIGTERM)
+            server.join()
+
+
+def bench_metrics(requests=20000):
+    import metrics
+    import task_04_flask
+
+    m = metrics.Metrics()
+    routes = ["/", "/status", "/data", "/info"]
+    n = 200000
+    start = time.perf_counter()
+    for i in range(n):
+        m.observe("GET", routes[i & 3], 200, 47, 0.0004)
+    per_call = (time.perf_counter() - start) / n
+    print("Metrics.observe():          %6.2f us/call" % (per_call * 1e6))
+
+    rates = {}
+    for enabled in (False, True):
+        process, port = start_server(concurrency="threaded", keep_alive=True,
+                                     metrics=enabled)
+        try:
+            drive(port, 8, requests // 10)  # warm up
+            rates[enabled] = drive(port, 8, requests)[0]
+        finally:
+            process.terminate()
+            process.join()
+    print("task_03_http_server (8 clients): %8.0f req/s off  %8.0f req/s on  (%+.1f%%)"
+          % (rates[False], rates[True], (rates[True] / rates[False] - 1) * 100))
+
+    client = task_04_flask.app.test_client()
+    for enabled in (False, True):
+        task_04_flask.metrics.enabled = enabled
+        start = time.perf_counter()
+        for i in range(requests // 4):
+            client.get(routes[i & 3] if i & 3 < 2 else "/data")
+        rates[enabled] = (requests // 4) / (time.perf_counter() - start)
+    task_04_flask.metrics.enabled = True
+    print("task_04_flask (test client):     %8.0f req/s off  %8.0f req/s on  (%+.1f%%)"
+          % (rates[False], rates[True], (rates[True] / rates[False] - 1) * 100))
+
+
+def _run_threads(threads, work):
+    """Run work(thread_index) on `threads` threads; return elapsed seconds."""
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.perf_counter() - start
+
+
+def bench_users(thread_counts=(1, 4, 16), adds=50000, recover=1000000):
+    import task_04_flask
+    from user_store import UserStore
+
+    print("%-28s" % "add_user" + "".join("%14s" % ("%d threads" % n) for n in thread_counts))
+    for name in ("UserStore.add, memory", "UserStore.add, on disk", "/add_user, memory"):
+        row = []
+        for threads in thread_counts:
+            data_dir = tempfile.mkdtemp() if "disk" in name else None
+            store = UserStore(data_dir=data_dir)
+            per_thread = adds // threads
+            if name.startswith("/add_user"):
+                task_04_flask.users = store
+                per_thread //= 10  # the full Flask route is much slower
+
+                def work(t):
+                    client = task_04_flask.app.test_client()
+                    for i in range(per_thread):
+                        client.post("/add_user", json={"username": "u%d-%d" % (t, i),
+                                                       "name": "N", "age": 1, "city": "C"})
+            else:
+                def work(t):
+                    for i in range(per_thread):
+                        store.add({"username": "u%d-%d" % (t, i), "name": "N", "age": 1,
+                                   "city": "C"})
+            elapsed = _run_threads(threads, work)
+            assert len(store) == per_thread * threads
+            row.append("%10.0f/s" % (per_thread * threads / elapsed))
+            store.close()
+            if data_dir:
+                shutil.rmtree(data_dir)
+        print("%-28s" % name + "".join("%14s" % r for r in row))
+
+    data_dir = tempfile.mkdtemp()
+    try:
+        store = UserStore(data_dir=data_dir)
+        start = time.perf_counter()
+        for i in range(recover):
+            store.add({"username": "user%d" % i, "name": "N", "age": 1, "city": "C"})
+        print("writing %d users: %.1fs" % (recover, time.perf_counter() - start))
+        store.close()
+        for label, compact in (("log replay", False), ("snapshots", True)):
+            if compact:
+                store = UserStore(data_dir=data_dir)
+                store.compact()
+                store.close()
+            start = time.perf_counter()
+            store = UserStore(data_dir=data_dir)
+            elapsed = time.perf_counter() - start
+            assert len(store) == recover
+            store.close()
+            print("recovering %d users from %s: %.2fs (%.0f users/s)"
+                  % (recover, label, elapsed, recover / elapsed))
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def bench_basic_auth(requests=2000):
+    import base64
+    import task_05_basic_security
+
+    client = task_05_basic_security.app.test_client()
+    headers = {"Authorization": "Basic " + base64.b64encode(b"user1:password").decode()}
+    cache = task_05_basic_security.credential_cache
+    rates = {}
+    for enabled in (False, True):
+        cache.enabled = enabled
+        cache.clear()
+        # every uncached request runs the KDF, so fewer of them do
+        n = requests if enabled else max(requests // 100, 10)
+        start = time.perf_counter()
+        for _ in range(n):
+            assert client.get("/basic-protected", headers=headers).status_code == 200
+        rates[enabled] = n / (time.perf_counter() - start)
+    cache.enabled = True
+    print("/basic-protected: %8.1f req/s uncached  %8.1f req/s cached  (%.0fx)"
+          % (rates[False], rates[True], rates[True] / rates[False]))
+
+
+def _serve_flask(module, env, port_queue, stop):
+    os.environ.update(env)
+    import importlib
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    app_module = importlib.import_module(module)
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True,
+                         request_handler=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    port_queue.put(server.server_port)
+    stop.wait()
+    server.shutdown()
+    app_module.kdf_pool.shutdown()
+
+
+def _timed_requests(port, method, path, body, headers, deadline, latencies, statuses):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - t0)
+            statuses.append(response.status)
+    finally:
+        conn.close()
+
+
+def _latency(latencies):
+    latencies.sort()
+    if not latencies:
+        return "-"
+    return "p50 %7.1fms  p95 %7.1fms" % (
+        latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.95)] * 1000)
+
+
+def bench_login(seconds=5.0, logins=4, others=4):
+    import json
+
+    body = json.dumps({"username": "user1", "password": "password"})
+    json_headers = {"Content-Type": "application/json"}
+    for label, workers in (("inline", "0"), ("pool(%d)" % (os.cpu_count() or 1), "")):
+        env = {"KDF_WORKERS": workers} if workers else {}
+        ports = multiprocessing.Queue()
+        stop = multiprocessing.Event()
+        # not a daemon: it starts the KDF worker processes itself
+        server = multiprocessing.Process(target=_serve_flask, args=(
+            "task_05_basic_security", env, ports, stop))
+        server.start()
+        try:
+            port = ports.get(timeout=60)
+            conn = http.client.HTTPConnection("127.0.0.1", port)
+            conn.request("POST", "/login", body=body, headers=json_headers)
+            token = json.loads(conn.getresponse().read())["access_token"]
+            conn.close()
+
+            deadline = time.perf_counter() + seconds
+            results = {"login": ([], []), "other": ([], [])}
+            threads = [threading.Thread(target=_timed_requests, args=(
+                port, "POST", "/login", body, json_headers, deadline) + results["login"])
+                for _ in range(logins)]
+            threads += [threading.Thread(target=_timed_requests, args=(
+                port, "GET", "/jwt-protected", None,
+                {"Authorization": "Bearer " + token}, deadline) + results["other"])
+                for _ in range(others)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            for kind, (latencies, statuses) in results.items():
+                print("%-8s %-6s %6d requests  %s  %d x 503" % (
+                    label, kind, len(latencies), _latency(latencies), statuses.count(503)))
+        finally:
+            stop.set()
+            server.join()
+
+
+def bench_jwt(tokens=10000):
+    os.environ.setdefault("KDF_WORKERS", "0")
+    import task_05_basic_security
+    from flask_jwt_extended import create_access_token
+
+    app = task_05_basic_security.app
+    manager = task_05_basic_security.jwt
+    cache = manager.token_cache
+    old_size = cache.maxsize
+    cache.maxsize = max(old_size, tokens)
+    with app.app_context():
+        encoded = [create_access_token(identity="user%d" % i,
+                                       additional_claims={"role": "admin"})
+                   for i in range(tokens)]
+    client = app.test_client()
+    try:
+        print("%d distinct tokens" % tokens)
+        for label, run in (
+                ("decode only", lambda token: manager._decode_jwt_from_config(token)),
+                ("/admin-only", lambda token: client.get(
+                    "/admin-only", headers={"Authorization": "Bearer " + token}))):
+            cost = {}
+            for name, enabled in (("uncached", False), ("cached", True)):
+                cache.enabled = enabled
+                with app.app_context():
+                    for token in encoded:  # fills the cache on the cached pass
+                        run(token)
+                    start = time.process_time()
+                    for token in encoded:
+                        run(token)
+                cost[name] = (time.process_time() - start) / tokens
+            print("%-12s %8.1f us uncached  %8.1f us cached  (%.1f us saved per request)"
+                  % (label, cost["uncached"] * 1e6, cost["cached"] * 1e6,
+                     (cost["uncached"] - cost["cached"]) * 1e6))
+    finally:
+        cache.enabled = True
+        cache.maxsize = old_size
+        cache.clear()
+
+
+def rss_kib(pid):
+    with open("/proc/%d/status" % pid) as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _ping(sock):
+    sock.sendall(b"GET /status HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    # headers and body may arrive in separate segments
+    data = b""
+    while b"\r\n\r\n" not in data or not data.endswith(b"OK"):
+        chunk = sock.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data.startswith(b"HTTP/1.1 200")
+
+
+CONNECTION_ENGINES = [
+    ("threaded+keepalive", dict(engine="stdlib", concurrency="threaded", keep_alive=True)),
+    ("asyncio", dict(engine="asyncio")),
+]
+
+
+def bench_connections(counts=(100, 1000, 5000), engines=CONNECTION_ENGINES):
+    print("%-20s %8s %12s %12s %10s" % ("engine", "conns", "server RSS", "per conn",
+                                        "answered"))
+    for name, options in engines:
+        for count in counts:
+            process, port = start_server(**options)
+            socks = []
+            try:
+                time.sleep(0.2)
+                base = rss_kib(process.pid)
+                for _ in range(count):
+                    sock = socket.create_connection(("127.0.0.1", port), timeout=30)
+                    _ping(sock)
+                    socks.append(sock)
+                time.sleep(0.5)
+                used = rss_kib(process.pid) - base
+                # every idle connection should still be served
+                answered = 0
+                for sock in socks:
+                    try:
+                        answered += _ping(sock)
+                    except OSError:
+                        pass
+                print("%-20s %8d %9.1f MiB %8.1f KiB %10d" % (
+                    name, count, used / 1024.0, used / float(count), answered))
+            except OSError as e:
+                print("%-20s %8d failed after %d connections: %s" % (
+                    name, count, len(socks), e))
+            finally:
+                for sock in socks:
+                    sock.close()
+                process.terminate()
+                process.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+    p = sub.add_parser("http")
+    p.add_argument("--requests", type=int, default=4000, help="requests per run")
+    p.add_argument("--clients", default="1,8,64", help="comma separated client counts")
+    p = sub.add_parser("connections")
+    p.add_argument("--counts", default="100,1000,5000",
+                   help="comma separated numbers of idle connections")
+    p = sub.add_parser("prefork")
+    p.add_argument("--processes", default="1,2,4,8,16",
+                   help="comma separated worker process counts")
+    p.add_argument("--requests", type=int, default=20000, help="requests per run")
+    p = sub.add_parser("metrics")
+    p.add_argument("--requests", type=int, default=20000, help="requests per run")
+    p = sub.add_parser("users")
+    p.add_argument("--threads", default="1,4,16", help="comma separated thread counts")
+    p.add_argument("--adds", type=int, default=50000, help="users added per run")
+    p.add_argument("--recover", type=int, default=1000000,
+                   help="users in the recovery benchmark")
+    p = sub.add_parser("basic-auth")
+    p.add_argument("--requests", type=int, default=2000, help="cached requests per run")
+    p = sub.add_parser("login")
+    p.add_argument("--seconds", type=float, default=5.0, help="duration of each run")
+    p.add_argument("--logins", type=int, default=4, help="clients calling /login")
+    p.add_argument("--others", type=int, default=4, help="clients calling /jwt-protected")
+    p = sub.add_parser("jwt")
+    p.add_argument("--tokens", type=int, default=10000, help="distinct tokens")
+    args = parser.parse_args(argv)
+
+    if args.benchmark == "http":
+        bench_http(args.requests, [int(c) for c in args.clients.split(",")])
+    elif args.benchmark == "connections":
+        bench_connections([int(c) for c in args.counts.split(",")])
+    elif args.benchmark == "prefork":
+        bench_prefork([int(c) for c in args.processes.split(",")], args.requests)
+    elif args.benchmark == "metrics":
+        bench_metrics(args.requests)
+    elif args.benchmark == "users":
+        bench_users([int(n) for n in args.threads.split(",")], args.adds, args.recover)
+    elif args.benchmark == "basic-auth":
+        bench_basic_auth(args.requests)
+    elif args.benchmark == "login":
+        bench_login(args.seconds, args.logins, args.others)
+    elif args.benchmark == "jwt":
+        bench_jwt(args.tokens)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+credential_cache.py
+
+Cache of recently verified Basic Auth credentials.
+
+Checking a password against its werkzeug hash runs a deliberately slow
+KDF, and a Basic Auth client sends its password with every request. Once
+a (username, password) pair has passed that check it is remembered for
+ttl seconds, so later requests only cost one HMAC.
+
+Entries are keyed by HMAC-SHA256(secret, username + password), with a
+random secret per process, so neither the password nor a fast unkeyed
+hash of it is ever stored. Each entry also records the password hash it
+was verified against; it stops matching as soon as the user's stored
+hash changes, for instance after a password change. Only successful
+checks are cached, so wrong guesses still pay for the KDF.
+"""
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class CredentialCache:
+    def __init__(self, ttl=60.0, maxsize=10000, enabled=True):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.enabled = enabled
+        self._secret = os.urandom(32)
+        self._entries = OrderedDict()  # key -> (expires, password hash)
+        self._lock = threading.Lock()
+
+    def _key(self, username, password):
+        message = username.encode("utf-8") + b"\0" + password.encode("utf-8")
+        return hmac.new(self._secret, message, hashlib.sha256).digest()
+
+    def check(self, username, password, password_hash):
+        """True if this pair was verified against password_hash within ttl."""
+        if not self.enabled:
+            return False
+        key = self._key(username, password)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            expires, verified_hash = entry
+            if expires < time.monotonic() or verified_hash != password_hash:
+                del self._entries[key]
+                return False
+            self._entries.move_to_end(key)
+            return True
+
+    def remember(self, username, password, password_hash):
+        """Record a pair that has just passed check_password_hash()."""
+        if not self.enabled:
+            return
+        key = self._key(username, password)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, password_hash)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+jwt_cache.py
+
+A JWTManager that remembers the claims of tokens it has already verified.
+
+flask_jwt_extended decodes and verifies the signature of the bearer token
+on every @jwt_required() request. CachingJWTManager first looks the exact
+encoded token up in a small LRU of tokens that passed verification before
+and returns their claims without decoding again. An entry is only used
+until the token's "exp" claim, so a cached token never outlives itself;
+once expired it goes through the normal path, which applies the leeway
+and raises the usual expired-token error.
+
+Requests with a CSRF value or allow_expired are never served from the
+cache, and nothing is cached while a custom decode_key_loader is set. The
+cache is keyed by the whole token, signature included, together with the
+decoding config (key, algorithms, audience, issuer, ...), so a token that
+differs in any byte, or that was verified before JWT_SECRET_KEY or the
+other decode settings changed, is verified from scratch.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask_jwt_extended import JWTManager
+from flask_jwt_extended.config import config
+from flask_jwt_extended.default_callbacks import default_decode_key_callback
+
+
+class TokenCache:
+    """LRU of key -> claims, each entry valid until the token's exp."""
+
+    def __init__(self, maxsize=10000, enabled=True):
+        self.maxsize = maxsize
+        self.enabled = enabled
+        self._entries = OrderedDict()  # key -> (exp, claims)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            # a copy, so a handler changing the claims cannot change the cache
+            return dict(entry[1])
+
+    def put(self, key, claims):
+        exp = claims.get("exp")
+        if not self.enabled or exp is None:
+            # tokens without an expiry are not cached at all
+            return
+        with self._lock:
+            self._entries[key] = (exp, dict(claims))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class CachingJWTManager(JWTManager):
+    def __init__(self, app=None, add_context_processor=False, cache=None):
+        self.token_cache = cache if cache is not None else TokenCache()
+        super().__init__(app, add_context_processor)
+
+    def _cache_key(self, encoded_token):
+        """The token plus every setting that decides whether it verifies."""
+        audience = config.decode_audience
+        if audience is not None and not isinstance(audience, str):
+            audience = tuple(audience)
+        return (encoded_token, config.decode_key, tuple(config.decode_algorithms), audience,
+                config.decode_issuer, config.identity_claim_key, config.verify_sub)
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        # a custom key loader may pick the key from the token itself
+        cacheable = (csrf_value is None and not allow_expired
+                     and self._decode_key_callback is default_decode_key_callback)
+        if cacheable:
+            key = self._cache_key(encoded_token)
+            claims = self.token_cache.get(key)
+            if claims is not None:
+                return claims
+        claims = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        if cacheable:
+            self.token_cache.put(key, claims)
+        return claims
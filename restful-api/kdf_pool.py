@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+kdf_pool.py
+
+Runs password hashing (werkzeug's deliberately slow KDF) in worker
+processes, so a burst of logins does not hold the GIL and stall every
+other request of the server.
+
+At most max_pending jobs may be queued or running at once. Past that,
+submitting raises PoolBusy straight away instead of queueing without
+bound; the web layer turns it into 503 Service Unavailable. A job that
+times out, or a worker process that dies, raises PoolBusy too; a broken
+pool is replaced by a fresh one for the next job. With
+workers=0 the hashing runs inline on the calling thread, which suits
+tests and machines where starting processes is not possible.
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PoolBusy(Exception):
+    """Raised when max_pending KDF jobs are in flight, or the pool cannot answer."""
+
+
+class KDFPool:
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending or max(self.workers, 1) * 4
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # the worker processes start on first use
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _run(self, func, *args, timeout=30):
+        if not self._slots.acquire(blocking=False):
+            raise PoolBusy("%d password hashing jobs already pending" % self.max_pending)
+        try:
+            if not self.workers:
+                return func(*args)
+            executor = self._pool()
+            try:
+                return executor.submit(func, *args).result(timeout)
+            except TimeoutError:
+                raise PoolBusy("password hashing took longer than %ss" % timeout)
+            except BrokenProcessPool:
+                self._discard(executor)
+                raise PoolBusy("a password hashing worker died")
+        finally:
+            self._slots.release()
+
+    def _discard(self, executor):
+        """Drop a broken executor so the next job starts a new one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def check(self, password_hash, password):
+        """check_password_hash() in a worker process."""
+        return self._run(check_password_hash, password_hash, password)
+
+    def generate(self, password):
+        """generate_password_hash() in a worker process."""
+        return self._run(generate_password_hash, password)
+
+    def generate_many(self, passwords):
+        """Hash several passwords in parallel (used at startup, not bounded)."""
+        if self.workers:
+            executor = self._pool()
+            try:
+                return list(executor.map(generate_password_hash, passwords))
+            except BrokenProcessPool:
+                # hash inline rather than fail startup
+                self._discard(executor)
+        return [generate_password_hash(p) for p in passwords]
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
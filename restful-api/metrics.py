@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+metrics.py
+
+Lightweight request metrics rendered in the Prometheus text format.
+
+Each thread records into its own shard (plain dicts reached through a
+threading.local), so observe() takes no lock and threads never contend.
+render() merges the shards when /metrics is scraped. Shards of threads
+that have exited are folded into one "retired" shard, on every scrape and
+whenever the number of shards doubles, so thread-per-connection servers do
+not pile up shards (or Thread objects) between scrapes.
+
+Exported series:
+  http_requests_total{method, route, status}           counter
+  http_response_bytes_total{method, route}              counter
+  http_request_duration_seconds{method, route}          histogram
+
+`route` is the matched route pattern, or "unmatched" for unknown paths,
+and `method` is one of the server's methods, or "other" for anything a
+client makes up; both keep label cardinality bounded. Label values are
+escaped.
+
+In a pre-forked server every worker process keeps its own numbers. After
+share(directory) a worker also writes its totals to
+directory/worker-<pid>.json every `interval` seconds, and render() adds
+the files of all other workers to its own live numbers, so any worker
+answers /metrics for the whole server. Other workers' numbers lag by at
+most one interval. Files of workers that have exited stay, so totals do
+not drop when a worker is replaced.
+"""
+
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0)
+
+
+class _Shard:
+    __slots__ = ("requests", "bytes", "durations")
+
+    def __init__(self):
+        self.requests = {}   # (method, route, status) -> count
+        self.bytes = {}      # (method, route) -> bytes sent
+        self.durations = {}  # (method, route) -> [bucket counts..., +Inf count, sum]
+
+    def to_json(self):
+        return {"requests": [list(k) + [v] for k, v in self.requests.items()],
+                "bytes": [list(k) + [v] for k, v in self.bytes.items()],
+                "durations": [list(k) + [v] for k, v in self.durations.items()]}
+
+    @classmethod
+    def from_json(cls, data):
+        shard = cls()
+        shard.requests = {(m, r, s): v for m, r, s, v in data["requests"]}
+        shard.bytes = {(m, r): v for m, r, v in data["bytes"]}
+        shard.durations = {(m, r): v for m, r, v in data["durations"]}
+        return shard
+
+    def merge(self, other, nbuckets):
+        for key, value in other.requests.items():
+            self.requests[key] = self.requests.get(key, 0) + value
+        for key, value in other.bytes.items():
+            self.bytes[key] = self.bytes.get(key, 0) + value
+        for key, value in other.durations.items():
+            mine = self.durations.get(key)
+            if mine is None:
+                mine = self.durations[key] = [0] * (nbuckets + 1) + [0.0]
+            for i, v in enumerate(value):
+                mine[i] += v
+
+
+class Metrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS, enabled=True, methods=("GET", "POST")):
+        self.buckets = tuple(buckets)
+        self.enabled = enabled
+        self.methods = frozenset(methods)
+        self._local = threading.local()
+        self._shards = []  # (thread, shard)
+        self._retired = _Shard()
+        self._lock = threading.Lock()
+        # fold dead threads' shards once there are this many
+        self._fold_at = 64
+        self._share_dir = None
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+                if len(self._shards) >= self._fold_at:
+                    self._fold_dead()
+                    # doubling keeps folding amortised O(1) with many live threads
+                    self._fold_at = max(64, 2 * len(self._shards))
+        return shard
+
+    def _fold_dead(self):
+        """Merge the shards of exited threads into _retired (lock held)."""
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                self._retired.merge(shard, len(self.buckets))
+        self._shards = alive
+
+    def observe(self, method, route, status, nbytes, seconds):
+        """Record one finished request."""
+        if not self.enabled:
+            return
+        if method not in self.methods:
+            method = "other"
+        shard = self._shard()
+        key = (method, route, status)
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+        key = (method, route)
+        shard.bytes[key] = shard.bytes.get(key, 0) + nbytes
+        hist = shard.durations.get(key)
+        if hist is None:
+            hist = shard.durations[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        # counts per bucket are stored non-cumulative and summed in render()
+        hist[bisect.bisect_left(self.buckets, seconds)] += 1
+        hist[-1] += seconds
+
+    def snapshot(self):
+        """Merge every shard into one _Shard."""
+        nbuckets = len(self.buckets)
+        total = _Shard()
+        with self._lock:
+            self._fold_dead()
+            total.merge(self._retired, nbuckets)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            # copies, since the owning thread may be adding keys meanwhile
+            copy = _Shard()
+            copy.requests = dict(shard.requests)
+            copy.bytes = dict(shard.bytes)
+            copy.durations = {k: list(v) for k, v in list(shard.durations.items())}
+            total.merge(copy, nbuckets)
+        return total
+
+    def share(self, directory, interval=1.0):
+        """Publish this process's totals to directory for the other workers.
+
+        Call it in each worker after fork; a daemon thread writes the file
+        every interval seconds, and flush() writes it right away.
+        """
+        self._share_dir = directory
+
+        def publish():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.flush()
+                except OSError:
+                    pass
+
+        threading.Thread(target=publish, name="metrics-share", daemon=True).start()
+
+    def _share_path(self, pid):
+        return os.path.join(self._share_dir, "worker-%d.json" % pid)
+
+    def flush(self):
+        """Write this process's totals to its file in the shared directory."""
+        if self._share_dir is None:
+            return
+        path = self._share_path(os.getpid())
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot().to_json(), f)
+        # readers only ever see a whole file
+        os.replace(tmp, path)
+
+    def combined(self):
+        """snapshot() plus the last published totals of every other worker."""
+        total = self.snapshot()
+        if self._share_dir is None:
+            return total
+        own = self._share_path(os.getpid())
+        for path in glob.glob(os.path.join(self._share_dir, "worker-*.json")):
+            if path == own:
+                continue
+            try:
+                with open(path, encoding="utf-8") as f:
+                    other = _Shard.from_json(json.load(f))
+            except (OSError, ValueError):
+                continue
+            total.merge(other, len(self.buckets))
+        return total
+
+    def render(self):
+        """Return all series in the Prometheus text exposition format."""
+        snap = self.combined()
+        lines = ["# HELP http_requests_total Requests handled.",
+                 "# TYPE http_requests_total counter"]
+        for (method, route, status), value in sorted(snap.requests.items()):
+            lines.append('http_requests_total{method="%s",route="%s",status="%s"} %d'
+                         % (_escape(method), _escape(route), _escape(str(status)), value))
+        lines += ["# HELP http_response_bytes_total Response body bytes sent.",
+                  "# TYPE http_response_bytes_total counter"]
+        for (method, route), value in sorted(snap.bytes.items()):
+            lines.append('http_response_bytes_total{method="%s",route="%s"} %d'
+                         % (_escape(method), _escape(route), value))
+        lines += ["# HELP http_request_duration_seconds Time to handle a request.",
+                  "# TYPE http_request_duration_seconds histogram"]
+        for (method, route), hist in sorted(snap.durations.items()):
+            labels = 'method="%s",route="%s"' % (_escape(method), _escape(route))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), hist):
+                cumulative += count
+                lines.append('http_request_duration_seconds_bucket{%s,le="%s"} %d'
+                             % (labels, bound, cumulative))
+            lines.append("http_request_duration_seconds_sum{%s} %.6f" % (labels, hist[-1]))
+            lines.append("http_request_duration_seconds_count{%s} %d" % (labels, cumulative))
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -1,45 +1,197 @@
 import requests
+import codecs
 import csv
+import json
+import os
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 API_URL = "https://jsonplaceholder.typicode.com/posts"
 
-def fetch_and_print_posts():
+# Columns written to posts.csv unless fields= says otherwise
+POST_FIELDS = ("id", "title", "body")
+
+
+def iter_json_array(chunks):
+    """Yield the elements of a top-level JSON array from an iterable of text chunks."""
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buf = ""
+    pos = 0
+    expect = "["  # then "first", "element" or ","
+    eof = False
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n":
+            pos += 1
+        if pos < len(buf):
+            char = buf[pos]
+            if expect == "[":
+                if char != "[":
+                    raise ValueError("Expected a JSON array")
+                expect = "first"
+                pos += 1
+                continue
+            # exactly one comma between elements, none before the closing bracket
+            if expect == ",":
+                if char == "]":
+                    return
+                if char != ",":
+                    raise ValueError("Expected ',' or ']' in JSON array")
+                expect = "element"
+                pos += 1
+                continue
+            if char == "]":
+                if expect == "first":
+                    return
+                raise ValueError("Trailing comma in JSON array")
+            if char == ",":
+                raise ValueError("Unexpected ',' in JSON array")
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = None
+            # an element ending at the buffer edge may be a truncated number
+            if end is not None and (end < len(buf) or eof):
+                yield obj
+                pos = end
+                expect = ","
+                continue
+        if eof:
+            raise ValueError("Unterminated JSON array")
+        chunk = next(chunks, "")
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+
+class PostsClient:
+    """One requests.Session plus a short-lived cache of parsed responses.
+
+    Every fetch through the same client reuses the pooled keep-alive
+    connection, and a successful response is parsed once and served from
+    the cache for cache_ttl seconds, so fetch_and_print_posts() followed by
+    fetch_and_save_posts() downloads the posts only once.
+    """
+
+    def __init__(self, url=API_URL, cache_ttl=30.0, timeout=10.0, pool_connections=4,
+                 pool_maxsize=16, retries=2):
+        self.url = url
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            # GETs are safe to retry on connection errors and 5xx answers
+            max_retries=Retry(total=retries, backoff_factor=0.2,
+                              status_forcelist=(502, 503, 504), raise_on_status=False),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._cache = {}  # url -> (expires, status code, parsed JSON)
+        self._lock = threading.Lock()
+
+    def get_json(self, url=None):
+        """Return (status code, parsed JSON or None) for url (default: self.url)."""
+        url = url or self.url
+        with self._lock:
+            entry = self._cache.get(url)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1], entry[2]
+
+        response = self.session.get(url, timeout=self.timeout)
+        if response.status_code != 200:
+            return response.status_code, None
+        data = response.json()
+
+        # only successful responses are cached
+        with self._lock:
+            self._cache[url] = (time.monotonic() + self.cache_ttl, response.status_code, data)
+        return response.status_code, data
+
+    def stream_json_array(self, url=None, chunk_size=65536):
+        """Return (status code, iterator over the elements of the JSON array or None).
+
+        The body is read and parsed chunk by chunk (stream=True), so memory
+        use does not grow with the size of the array. Streams bypass the cache.
+        """
+        response = self.session.get(url or self.url, timeout=self.timeout, stream=True)
+        if response.status_code != 200:
+            response.close()
+            return response.status_code, None
+
+        def elements():
+            decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")()
+            chunks = (decoder.decode(chunk) for chunk in response.iter_content(chunk_size))
+            try:
+                yield from iter_json_array(chunks)
+            finally:
+                response.close()
+
+        return response.status_code, elements()
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def close(self):
+        self.session.close()
+
+
+# Shared by the functions below (and any future ones)
+default_client = PostsClient()
+
+
+def fetch_and_print_posts(client=None):
     """Fetch posts and print the status code + titles."""
-    response = requests.get(API_URL)
+    status_code, posts = (client or default_client).get_json()
 
     # Print status code
-    print(f"Status Code: {response.status_code}")
-
-    # If successful, parse JSON
-    if response.status_code == 200:
-        posts = response.json()
+    print(f"Status Code: {status_code}")
 
-        # Print each post title
+    # If successful, print each post title
+    if status_code == 200:
         for post in posts:
             print(post["title"])
     else:
         print("Failed to fetch posts.")
 
 
-def fetch_and_save_posts():
-    """Fetch posts and save selected fields to posts.csv."""
-    response = requests.get(API_URL)
+def fetch_and_save_posts(client=None, stream=False, fields=POST_FIELDS, filename="posts.csv"):
+    """Fetch posts and save selected fields (default: id, title, body) to posts.csv.
 
-    if response.status_code == 200:
-        posts = response.json()
-
-        # Create list of dictionaries with id, title, body
-        formatted_posts = [
-            {"id": post["id"], "title": post["title"], "body": post["body"]}
-            for post in posts
-        ]
+    With stream=True the response is parsed and written one post at a time
+    as it arrives, instead of loading the whole feed first. Rows go to
+    filename + ".tmp", which replaces filename only once every post is
+    written, so an error mid-stream leaves the previous file untouched.
+    """
+    client = client or default_client
+    if stream:
+        status_code, posts = client.stream_json_array()
+    else:
+        status_code, posts = client.get_json()
 
-        # Write to CSV
-        with open("posts.csv", "w", newline="", encoding="utf-8") as csv_file:
-            writer = csv.DictWriter(csv_file, fieldnames=["id", "title", "body"])
-            writer.writeheader()
-            writer.writerows(formatted_posts)
+    if status_code == 200:
+        # Write to CSV; DictWriter keeps only the selected fields of each post
+        tmp = filename + ".tmp"
+        try:
+            with open(tmp, "w", newline="", encoding="utf-8") as csv_file:
+                writer = csv.DictWriter(csv_file, fieldnames=list(fields), extrasaction="ignore")
+                writer.writeheader()
+                for post in posts:
+                    writer.writerow(post)
+            os.replace(tmp, filename)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
 
-        print("posts.csv created successfully.")
+        print(f"{filename} created successfully.")
     else:
-        print("Failed to fetch and save posts.")
\ No newline at end of file
+        print("Failed to fetch and save posts.")
@@ -9,91 +9,630 @@ Endpoints:
   GET /status   -> plain text "OK"
   GET /data     -> JSON {"name": "John", "age": 30, "city": "New York"}
   GET /info     -> JSON {"version": "1.0", "description": "A simple API built with http.server"}
+  POST /echo    -> JSON {"received": <body>, "message": "Echo successful"}
+  GET /metrics  -> request counts, bytes and latency histograms (Prometheus text)
 Any other path -> 404 Not Found with plain text "Endpoint not found"
+
+Routes live in two tables: STATIC_ROUTES holds fixed responses serialized
+once at import time, DYNAMIC_ROUTES maps (method, path) to a handler
+function registered with @route(...). POST bodies (Content-Length or
+chunked) are capped at MAX_BODY_SIZE; larger ones get 413.
+
+run() serves one request at a time by default. Pass concurrency="threaded"
+for a thread per connection, or concurrency="pool" for a bounded pool of
+`workers` threads, and keep_alive=True to speak HTTP/1.1 with persistent
+connections (only useful with a concurrent mode: in "single" mode one idle
+client would hold the whole server).
+
+run_async() serves the same routes from one asyncio event loop, which holds
+thousands of idle keep-alive clients without a thread each. Start it with
+`python3 task_03_http_server.py --asyncio`.
+
+run(processes=N) / run_prefork() fork N worker processes sharing the port,
+so the pure-Python handlers are not limited to one core by the GIL. Start
+it with `python3 task_03_http_server.py --processes N`.
 """
 
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+import http.client
+from http.client import parse_headers
+from http.server import HTTPServer, BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
 import json
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import traceback
 from urllib.parse import urlparse
 
+from metrics import CONTENT_TYPE, Metrics
+
 HOST = "0.0.0.0"
 PORT = 8000
 
+def json_response(obj, status=200):
+    """Pre-serialize a JSON response as (status, headers, body bytes)."""
+    body = json.dumps(obj).encode("utf-8")
+    # Use exactly 'application/json' to satisfy strict content-type checks in tests
+    return (status, (("Content-Type", "application/json"),
+                     ("Content-Length", str(len(body)))), body)
+
+
+def text_response(text, status=200):
+    """Pre-serialize a plain text response as (status, headers, body bytes)."""
+    body = text.encode("utf-8")
+    # text/plain with default charset is acceptable
+    return (status, (("Content-Type", "text/plain; charset=utf-8"),
+                     ("Content-Length", str(len(body)))), body)
+
+
+# Unknown endpoint: plain text 404 with the exact message expected by tests
+NOT_FOUND = text_response("Endpoint not found", status=404)
+BAD_REQUEST = text_response("Bad Request", status=400)
+PAYLOAD_TOO_LARGE = text_response("Payload Too Large", status=413)
+NOT_IMPLEMENTED = text_response("Not Implemented", status=501)
+
+# Methods with a do_<METHOD> on SimpleAPIHandler; others get 501, as from http.server
+HANDLED_METHODS = ("GET", "POST")
+
+# Largest request body accepted, in bytes (Content-Length or chunked)
+MAX_BODY_SIZE = 1024 * 1024
+BODY_READ_SIZE = 64 * 1024
+MAX_CHUNK_LINE = 1024
+
+
+class RequestBodyError(Exception):
+    """The request body could not be read; `response` says why."""
+
+    def __init__(self, response):
+        super().__init__(response[2].decode("utf-8"))
+        self.response = response
+
+
+def _body_length(headers, max_size):
+    """Return the Content-Length to read, or None for a chunked body."""
+    if "chunked" in headers.get("Transfer-Encoding", "").lower():
+        return None
+    try:
+        length = int(headers.get("Content-Length", 0))
+    except ValueError:
+        raise RequestBodyError(BAD_REQUEST)
+    if length < 0:
+        raise RequestBodyError(BAD_REQUEST)
+    if length > max_size:
+        raise RequestBodyError(PAYLOAD_TOO_LARGE)
+    return length
+
+
+def _chunk_size(line, received, max_size):
+    if not line.endswith(b"\n"):
+        raise RequestBodyError(BAD_REQUEST)
+    try:
+        size = int(line.split(b";", 1)[0].strip(), 16)
+    except ValueError:
+        raise RequestBodyError(BAD_REQUEST)
+    if size < 0:
+        raise RequestBodyError(BAD_REQUEST)
+    if received + size > max_size:
+        raise RequestBodyError(PAYLOAD_TOO_LARGE)
+    return size
+
+
+def read_body(rfile, headers, max_size=None):
+    """Read a request body from a blocking file into a single bytearray.
+
+    The body is read in BODY_READ_SIZE pieces straight into its final
+    buffer, so no intermediate copies are kept. Raises RequestBodyError
+    (413 above max_size, default MAX_BODY_SIZE; 400 when malformed or
+    truncated).
+    """
+    max_size = MAX_BODY_SIZE if max_size is None else max_size
+    length = _body_length(headers, max_size)
+    if length is not None:
+        body = bytearray(length)
+        view = memoryview(body)
+        pos = 0
+        while pos < length:
+            n = rfile.readinto(view[pos:pos + BODY_READ_SIZE])
+            if not n:
+                raise RequestBodyError(BAD_REQUEST)
+            pos += n
+        return body
+
+    body = bytearray()
+    while True:
+        size = _chunk_size(rfile.readline(MAX_CHUNK_LINE), len(body), max_size)
+        if size == 0:
+            break
+        while size:
+            piece = rfile.read(min(size, BODY_READ_SIZE))
+            if not piece:
+                raise RequestBodyError(BAD_REQUEST)
+            body += piece
+            size -= len(piece)
+        if rfile.readline(MAX_CHUNK_LINE).strip():
+            raise RequestBodyError(BAD_REQUEST)
+    # skip optional trailer headers up to the blank line
+    while True:
+        line = rfile.readline(MAX_CHUNK_LINE)
+        if not line.strip():
+            return body
+
+
+async def read_body_async(reader, headers, max_size=None):
+    """asyncio counterpart of read_body()."""
+    max_size = MAX_BODY_SIZE if max_size is None else max_size
+    length = _body_length(headers, max_size)
+    if length is not None:
+        return await reader.readexactly(length) if length else b""
+
+    body = bytearray()
+    while True:
+        size = _chunk_size(await reader.readline(), len(body), max_size)
+        if size == 0:
+            break
+        body += await reader.readexactly(size)
+        if (await reader.readline()).strip():
+            raise RequestBodyError(BAD_REQUEST)
+    while (await reader.readline()).strip():
+        pass
+    return body
+
+# (method, path) -> response built once at import time
+STATIC_ROUTES = {
+    ("GET", "/"): text_response("Hello, this is a simple API!"),
+    ("GET", "/status"): text_response("OK"),
+    ("GET", "/data"): json_response({"name": "John", "age": 30, "city": "New York"}),
+    ("GET", "/info"): json_response({"version": "1.0",
+                                     "description": "A simple API built with http.server"}),
+}
+
+# (method, path) -> handler(request_handler, body_bytes) returning a response tuple
+DYNAMIC_ROUTES = {}
+
+METRICS = Metrics()
+
+
+def _route_label(key):
+    # Unknown paths share one label so clients cannot blow up the series count
+    if key in STATIC_ROUTES or key in DYNAMIC_ROUTES:
+        return key[1]
+    return "unmatched"
+
+
+def add_static_route(method, path, response):
+    STATIC_ROUTES[(method, path)] = response
+
+
+def route(method, path):
+    """Register a function as the dynamic handler for method + path."""
+    def register(func):
+        DYNAMIC_ROUTES[(method, path)] = func
+        return func
+    return register
+
+
+@route("POST", "/echo")
+def echo(handler, body_bytes):
+    content_type = handler.headers.get("Content-Type", "")
+    if "application/json" not in content_type:
+        return text_response("Content-Type must be application/json", status=415)
+    try:
+        # json.loads decodes the bytes to a str before parsing, so the body is
+        # held as bytes, str and parsed object at once; MAX_BODY_SIZE is what
+        # bounds that. The stdlib has no streaming parser for a single value.
+        data = json.loads(body_bytes or b"{}")
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return text_response("Invalid JSON", status=400)
+    return json_response({"received": data, "message": "Echo successful"})
+
+
+@route("GET", "/metrics")
+def metrics(handler, body_bytes):
+    body = METRICS.render().encode("utf-8")
+    return (200, (("Content-Type", CONTENT_TYPE), ("Content-Length", str(len(body)))), body)
+
+
 class SimpleAPIHandler(BaseHTTPRequestHandler):
-    def _send_json(self, obj, status=200):
-        body = json.dumps(obj).encode("utf-8")
-        self.send_response(status)
-        # Use exactly 'application/json' to satisfy strict content-type checks in tests
-        self.send_header("Content-Type", "application/json")
-        self.send_header("Content-Length", str(len(body)))
-        self.end_headers()
-        self.wfile.write(body)
+    # None means MAX_BODY_SIZE
+    max_body_size = None
+    _route = "unmatched"
+    _started = 0.0
 
-    def _send_text(self, text, status=200):
-        body = text.encode("utf-8")
+    def _send(self, response, close=False):
+        status, headers, body = response
         self.send_response(status)
-        # text/plain with default charset is acceptable
-        self.send_header("Content-Type", "text/plain; charset=utf-8")
-        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        if close:
+            self.send_header("Connection", "close")
+            self.close_connection = True
         self.end_headers()
         self.wfile.write(body)
+        METRICS.observe(self.command, self._route, status, len(body),
+                        time.perf_counter() - self._started)
 
-    def do_GET(self):
-        parsed = urlparse(self.path)
-        path = parsed.path
+    def _send_json(self, obj, status=200):
+        self._send(json_response(obj, status))
 
-        if path == "/":
-            self._send_text("Hello, this is a simple API!", status=200)
-            return
+    def _send_text(self, text, status=200):
+        self._send(text_response(text, status))
 
-        if path == "/status":
-            self._send_text("OK", status=200)
-            return
+    def _path(self):
+        path = self.path
+        if not path.startswith("/"):
+            # absolute-form request target, e.g. "http://host/status"
+            return urlparse(path).path
+        return path.split("?", 1)[0]
 
-        if path == "/data":
-            payload = {"name": "John", "age": 30, "city": "New York"}
-            self._send_json(payload, status=200)
-            return
+    def _dispatch(self, method, body_bytes=b""):
+        key = (method, self._path())
+        self._route = _route_label(key)
+        response = STATIC_ROUTES.get(key)
+        if response is None:
+            handler = DYNAMIC_ROUTES.get(key)
+            response = handler(self, body_bytes) if handler else NOT_FOUND
+        self._send(response)
 
-        if path == "/info":
-            payload = {"version": "1.0", "description": "A simple API built with http.server"}
-            self._send_json(payload, status=200)
+    def _handle(self, method):
+        self._started = time.perf_counter()
+        self._route = _route_label((method, self._path()))
+        # Any body is read, even on a GET that ignores it; left unread on a
+        # keep-alive connection it would be parsed as the next request
+        try:
+            body_bytes = read_body(self.rfile, self.headers, self.max_body_size)
+        except RequestBodyError as e:
+            # the rest of the body is unread, so the connection cannot be reused
+            self._send(e.response, close=True)
             return
+        self._dispatch(method, body_bytes)
 
-        # Unknown endpoint: return plain text 404 with the exact message expected by tests
-        self._send_text("Endpoint not found", status=404)
+    def do_GET(self):
+        self._handle("GET")
 
     def do_POST(self):
-        # Minimal POST handler to satisfy potential tests (not required by current tests)
-        parsed = urlparse(self.path)
-        path = parsed.path
+        self._handle("POST")
 
-        content_length = int(self.headers.get("Content-Length", 0))
-        content_type = self.headers.get("Content-Type", "")
+    # Keep output clean for tests
+    def log_message(self, format, *args):
+        return
 
-        body_bytes = self.rfile.read(content_length) if content_length > 0 else b""
+class KeepAliveAPIHandler(SimpleAPIHandler):
+    # Every response carries Content-Length, so HTTP/1.1 connections can stay open
+    protocol_version = "HTTP/1.1"
+    # Seconds an idle keep-alive connection may hold a worker
+    timeout = 15
+    # Headers and body are separate writes; without TCP_NODELAY the second
+    # one waits for the client's delayed ACK on a reused connection
+    disable_nagle_algorithm = True
 
-        if path == "/echo":
-            if "application/json" in content_type:
-                try:
-                    data = json.loads(body_bytes.decode("utf-8") or "{}")
-                    resp = {"received": data, "message": "Echo successful"}
-                    self._send_json(resp, status=200)
-                except json.JSONDecodeError:
-                    self._send_text("Invalid JSON", status=400)
+
+class ThreadedHTTPServer(ThreadingHTTPServer):
+    """Thread-per-connection server with a deeper listen queue."""
+
+    request_queue_size = 128
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer handing connections to a fixed pool of worker threads.
+
+    At most `workers + backlog` connections are accepted at once; beyond
+    that the accept loop waits, leaving new clients in the listen queue.
+    """
+
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, workers=16, backlog=64,
+                 bind_and_activate=True):
+        super().__init__(server_address, handler_class, bind_and_activate)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(workers + backlog)
+
+    def process_request(self, request, client_address):
+        self.slots.acquire()
+        self.pool.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+
+def make_server(host=HOST, port=PORT, concurrency="single", workers=16, keep_alive=False,
+                handler_class=None, reuse_port=False):
+    """Create (but do not start) a server for the given serving mode.
+
+    reuse_port=True sets SO_REUSEPORT so several processes can each bind
+    their own socket to the same port and let the kernel spread connections.
+    """
+    if handler_class is None:
+        handler_class = KeepAliveAPIHandler if keep_alive else SimpleAPIHandler
+    if concurrency == "single":
+        httpd = HTTPServer((host, port), handler_class, bind_and_activate=False)
+    elif concurrency == "threaded":
+        httpd = ThreadedHTTPServer((host, port), handler_class, bind_and_activate=False)
+    elif concurrency == "pool":
+        httpd = PooledHTTPServer((host, port), handler_class, workers=workers,
+                                 bind_and_activate=False)
+    else:
+        raise ValueError("Unknown concurrency mode: %r" % (concurrency,))
+    try:
+        if reuse_port:
+            httpd.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        httpd.server_bind()
+        httpd.server_activate()
+    except BaseException:
+        httpd.server_close()
+        raise
+    return httpd
+
+
+# ---------------------------------------------------------------------------
+# asyncio engine: same routes and responses, one coroutine per connection
+# ---------------------------------------------------------------------------
+
+MAX_HEADER_BYTES = 64 * 1024
+ASYNC_KEEPALIVE_TIMEOUT = 15
+_date_cache = [0, ""]
+
+
+def _http_date():
+    now = int(time.time())
+    if _date_cache[0] != now:
+        _date_cache[0] = now
+        _date_cache[1] = formatdate(now, usegmt=True)
+    return _date_cache[1]
+
+
+class _AsyncRequest:
+    """What dynamic route handlers see of a request in the asyncio engine."""
+
+    def __init__(self, method, path, headers):
+        self.command = method
+        self.path = path
+        self.headers = headers
+
+
+def _encode_response(response, keep_alive):
+    status, headers, body = response
+    lines = ["HTTP/1.1 %d %s" % (status, HTTPStatus(status).phrase),
+             "Server: SimpleAPI-asyncio",
+             "Date: " + _http_date()]
+    lines.extend("%s: %s" % header for header in headers)
+    if not keep_alive:
+        lines.append("Connection: close")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+async def _handle_connection(reader, writer):
+    try:
+        while True:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"),
+                                              ASYNC_KEEPALIVE_TIMEOUT)
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                return
+            except asyncio.LimitOverrunError:
+                writer.write(_encode_response(BAD_REQUEST, False))
+                return
+
+            started = time.perf_counter()
+            request_line, _, header_block = head.partition(b"\r\n")
+            try:
+                method, target, version = request_line.decode("latin-1").split()
+                headers = parse_headers(io.BytesIO(header_block))
+            except (ValueError, http.client.HTTPException):
+                writer.write(_encode_response(BAD_REQUEST, False))
+                return
+
+            connection = headers.get("Connection", "").lower()
+            if version == "HTTP/1.1":
+                keep_alive = connection != "close"
             else:
-                self._send_text("Content-Type must be application/json", status=415)
-            return
+                keep_alive = connection == "keep-alive"
 
-        self._send_text("Endpoint not found", status=404)
+            if method not in HANDLED_METHODS:
+                # the body, if any, is not read, so the connection cannot be reused
+                writer.write(_encode_response(NOT_IMPLEMENTED, False))
+                METRICS.observe(method, "unmatched", 501, len(NOT_IMPLEMENTED[2]),
+                                time.perf_counter() - started)
+                return
 
-    # Keep output clean for tests
-    def log_message(self, format, *args):
+            path = target.split("?", 1)[0] if target.startswith("/") else urlparse(target).path
+            key = (method, path)
+            try:
+                body_bytes = await read_body_async(reader, headers)
+            except RequestBodyError as e:
+                writer.write(_encode_response(e.response, False))
+                METRICS.observe(method, _route_label(key), e.response[0], len(e.response[2]),
+                                time.perf_counter() - started)
+                return
+
+            response = STATIC_ROUTES.get(key)
+            if response is None:
+                handler = DYNAMIC_ROUTES.get(key)
+                if handler is None:
+                    response = NOT_FOUND
+                else:
+                    response = handler(_AsyncRequest(method, target, headers), body_bytes)
+
+            writer.write(_encode_response(response, keep_alive))
+            METRICS.observe(method, _route_label(key), response[0], len(response[2]),
+                            time.perf_counter() - started)
+            await writer.drain()
+            if not keep_alive:
+                return
+    except (asyncio.IncompleteReadError, ConnectionError):
         return
+    finally:
+        writer.close()
+
+
+async def start_async_server(host=HOST, port=PORT, backlog=1024, sock=None):
+    """Start the asyncio engine and return its asyncio.Server.
+
+    Pass an already listening `sock` to serve it instead of binding host:port.
+    """
+    if sock is not None:
+        return await asyncio.start_server(_handle_connection, sock=sock,
+                                          limit=MAX_HEADER_BYTES)
+    return await asyncio.start_server(_handle_connection, host, port,
+                                      limit=MAX_HEADER_BYTES, backlog=backlog)
+
+
+def run_async(host=HOST, port=PORT):
+    """Serve the same endpoints as run() from a single asyncio event loop."""
+    async def main():
+        server = await start_async_server(host, port)
+        print(f"Serving HTTP (asyncio) on {host}:{port} ...")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nShutting down server.")
+
+
+# ---------------------------------------------------------------------------
+# Pre-fork mode: N worker processes serving one port
+# ---------------------------------------------------------------------------
+
+# A worker that dies sooner than this after starting is restarted with a delay
+RESTART_MIN_UPTIME = 1.0
+RESTART_DELAY = 1.0
+
+
+def _worker_main(listener, engine, options, metrics_dir=None):
+    """Body of one pre-forked worker; never returns."""
+    status = 0
+    if metrics_dir is not None:
+        METRICS.share(metrics_dir)
+    try:
+        if engine == "asyncio":
+            async def serve():
+                server = await start_async_server(sock=listener.socket)
+                loop = asyncio.get_running_loop()
+                loop.add_signal_handler(signal.SIGTERM, server.close)
+                async with server:
+                    try:
+                        await server.serve_forever()
+                    except asyncio.CancelledError:
+                        pass
+            asyncio.run(serve())
+        else:
+            httpd = listener if listener is not None else make_server(reuse_port=True, **options)
+            signal.signal(signal.SIGTERM,
+                          lambda signum, frame: threading.Thread(target=httpd.shutdown).start())
+            httpd.serve_forever()
+            httpd.server_close()
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        traceback.print_exc()
+        status = 1
+    finally:
+        try:
+            METRICS.flush()
+        except OSError:
+            pass
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+
+def run_prefork(processes=None, host=HOST, port=PORT, concurrency="threaded", workers=16,
+                keep_alive=True, engine="stdlib", reuse_port=False):
+    """Serve from `processes` forked workers (default: one per CPU).
+
+    The parent binds the listening socket and the workers inherit it, or
+    with reuse_port=True each worker binds its own SO_REUSEPORT socket.
+    A worker that exits unexpectedly is replaced. SIGTERM or Ctrl+C on the
+    parent stops the workers gracefully: they stop accepting, finish the
+    request at hand and exit. engine="asyncio" runs run_async()'s event loop
+    in every worker instead of a stdlib server. Workers share their metrics
+    through a temporary directory, so /metrics covers all of them.
+    """
+    processes = processes or os.cpu_count() or 1
+    options = dict(host=host, port=port, concurrency=concurrency, workers=workers,
+                   keep_alive=keep_alive)
+    if reuse_port and engine == "stdlib":
+        listener = None
+    else:
+        listener = make_server(reuse_port=reuse_port, **options)
+
+    metrics_dir = tempfile.mkdtemp(prefix="metrics-")
+    children = {}
+    stopping = []
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            _worker_main(listener, engine, options, metrics_dir)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        if not stopping:
+            stopping.append(signum)
+            for pid in list(children):
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+    previous = (signal.signal(signal.SIGTERM, stop), signal.signal(signal.SIGINT, stop))
+    print(f"Serving HTTP on {host}:{port} with {processes} worker processes ...")
+    try:
+        for _ in range(processes):
+            spawn()
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            started = children.pop(pid, None)
+            if started is None or stopping:
+                continue
+            print(f"Worker {pid} exited with status {status}; restarting.")
+            if time.monotonic() - started < RESTART_MIN_UPTIME:
+                time.sleep(RESTART_DELAY)
+            if not stopping:
+                spawn()
+    finally:
+        signal.signal(signal.SIGTERM, previous[0])
+        signal.signal(signal.SIGINT, previous[1])
+        if listener is not None:
+            listener.server_close()
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+    print("\nShutting down server.")
+
 
-def run(server_class=HTTPServer, handler_class=SimpleAPIHandler, host=HOST, port=PORT):
-    server_address = (host, port)
-    httpd = server_class(server_address, handler_class)
+def run(server_class=None, handler_class=None, host=HOST, port=PORT,
+        concurrency="single", workers=16, keep_alive=False, processes=1):
+    if processes > 1:
+        return run_prefork(processes, host, port, concurrency, workers, keep_alive)
+    if server_class is not None:
+        httpd = server_class((host, port), handler_class or SimpleAPIHandler)
+    else:
+        httpd = make_server(host, port, concurrency, workers, keep_alive, handler_class)
     print(f"Serving HTTP on {host}:{port} ...")
     try:
         httpd.serve_forever()
@@ -102,4 +641,11 @@ def run(server_class=HTTPServer, handler_class=SimpleAPIHandler, host=HOST, port
         httpd.server_close()
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    args = sys.argv[1:]
+    if "--processes" in args:
+        engine = "asyncio" if "--asyncio" in args else "stdlib"
+        run_prefork(int(args[args.index("--processes") + 1]), engine=engine)
+    elif "--asyncio" in args:
+        run_async()
+    else:
+        run()
\ No newline at end of file
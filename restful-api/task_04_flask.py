@@ -8,22 +8,69 @@ Endpoints:
   GET  /               -> "Welcome to the Flask API!"
   GET  /status         -> "OK"
   GET  /data           -> JSON list of usernames (e.g. ["jane","john"])
+  GET  /data?limit=N&after=<u>&prefix=<p>
+                       -> one page of usernames in sorted order, all greater
+                          than `after` and starting with `prefix`. A full page
+                          carries a Link: <...>; rel="next" header with the
+                          cursor for the following page.
   GET  /users/<u>      -> JSON user object or 404 {"error":"User not found"}
   POST /add_user       -> Add a user (expects JSON). Responses:
                            201 {"message":"User added","user":{...}}
                            400 {"error":"Invalid JSON"} (bad body)
                            400 {"error":"Username is required"} (missing username)
+                           400 {"error":"Username must be a string"} (non-string username)
                            409 {"error":"Username already exists"} (duplicate)
+  POST /add_users      -> Add a JSON array of users in one pass. Responds 200
+                          {"results":[...]} with one entry per item, in order:
+                           {"status":201,"user":{...}} | {"status":400,"error":...}
+                           | {"status":409,"error":"Username already exists"}
+                          400 if the body is not an array or has more than
+                          MAX_BATCH_SIZE items
+  POST /users/batch_get -> JSON array of usernames in, {"<username>": user or null}
+  GET  /metrics        -> request counts, bytes and latency histograms (Prometheus text)
+
+Users live in a UserStore (see user_store.py). Set USER_STORE_DIR to keep them
+on disk across restarts; otherwise they are kept in memory only.
 """
 
-from flask import Flask, jsonify, request
+import os
+import time
+from urllib.parse import urlencode
+
+from flask import Flask, Response, g, jsonify, request
 from werkzeug.exceptions import BadRequest
 
+from metrics import CONTENT_TYPE, Metrics
+from user_store import UserStore
+
 app = Flask(__name__)
+metrics = Metrics()
+
+# Start with an empty in-memory user store to avoid test pollution.
+# users: UserStore mapping username -> user dict (which includes 'username' key)
+users = UserStore(data_dir=os.environ.get("USER_STORE_DIR"))
+
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_metrics(response):
+    started = g.get("request_started")
+    if started is not None:
+        # url_rule is the pattern (e.g. /users/<username>), keeping labels bounded
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        nbytes = response.calculate_content_length() or 0
+        metrics.observe(request.method, route, response.status_code, nbytes,
+                        time.perf_counter() - started)
+    return response
 
-# Start with an empty user store to avoid test pollution.
-# users: dict mapping username -> user dict (which includes 'username' key)
-users = {}
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
 
 
 @app.route("/", methods=["GET"])
@@ -36,10 +83,35 @@ def status():
     return "OK"
 
 
+# Page size of /data when paging is asked for without a limit, and its cap
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
 @app.route("/data", methods=["GET"])
 def list_usernames():
-    # Return a JSON list of usernames
-    return jsonify(list(users.keys()))
+    args = request.args
+    if not any(name in args for name in ("limit", "after", "prefix")):
+        # Return a JSON list of every username, as before
+        return jsonify(list(users.keys()))
+
+    try:
+        limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({"error": "limit must be between 1 and %d" % MAX_PAGE_SIZE}), 400
+
+    prefix = args.get("prefix", "")
+    names = users.page(limit, args.get("after"), prefix)
+    response = jsonify(names)
+    if len(names) == limit:
+        # the last name of a full page is the cursor for the next one
+        query = {"limit": limit, "after": names[-1]}
+        if prefix:
+            query["prefix"] = prefix
+        response.headers["Link"] = '<%s?%s>; rel="next"' % (request.path, urlencode(query))
+    return response
 
 
 @app.route("/users/<username>", methods=["GET"])
@@ -50,29 +122,30 @@ def get_user(username):
     return jsonify(user)
 
 
-@app.route("/add_user", methods=["POST"])
-def add_user():
-    # Parse JSON safely, return 400 for invalid JSON
+# Largest batch accepted by /add_users and /users/batch_get
+MAX_BATCH_SIZE = 10000
+
+
+def _parse_json():
+    """Return the request's JSON body, or None if it is missing or invalid."""
     try:
-        data = request.get_json(force=False)
+        return request.get_json(force=False)
     except BadRequest:
-        return jsonify({"error": "Invalid JSON"}), 400
+        return None
 
-    # get_json returns None if no JSON body or invalid JSON
-    if data is None:
-        return jsonify({"error": "Invalid JSON"}), 400
 
+def build_user(data):
+    """Validate one user record; return (user_obj, None) or (None, error message)."""
     # Must be a mapping/dict
     if not isinstance(data, dict):
-        return jsonify({"error": "Invalid JSON"}), 400
+        return None, "Invalid JSON"
 
     username = data.get("username")
     if not username:
-        return jsonify({"error": "Username is required"}), 400
-
-    # Check duplicate
-    if username in users:
-        return jsonify({"error": "Username already exists"}), 409
+        return None, "Username is required"
+    # the store and its sorted index key users by str
+    if not isinstance(username, str):
+        return None, "Username must be a string"
 
     # Build user object including username
     user_obj = {
@@ -81,12 +154,66 @@ def add_user():
         "age": data.get("age"),
         "city": data.get("city"),
     }
+    return user_obj, None
+
 
-    users[username] = user_obj
+@app.route("/add_user", methods=["POST"])
+def add_user():
+    # get_json returns None if no JSON body; invalid JSON is also None here
+    user_obj, error = build_user(_parse_json())
+    if error:
+        return jsonify({"error": error}), 400
+
+    # Check duplicate and insert in one step, so concurrent adds cannot both win
+    if not users.add(user_obj):
+        return jsonify({"error": "Username already exists"}), 409
 
     return jsonify({"message": "User added", "user": user_obj}), 201
 
 
+@app.route("/add_users", methods=["POST"])
+def add_users():
+    data = _parse_json()
+    if not isinstance(data, list):
+        return jsonify({"error": "Expected a JSON array of users"}), 400
+    if len(data) > MAX_BATCH_SIZE:
+        return jsonify({"error": "At most %d users per batch" % MAX_BATCH_SIZE}), 400
+
+    results = []
+    valid = []
+    for item in data:
+        user_obj, error = build_user(item)
+        if error:
+            results.append({"status": 400, "error": error})
+        else:
+            results.append(None)
+            valid.append(user_obj)
+
+    # one pass over the store for every valid user
+    added = iter(users.add_many(valid))
+    valid = iter(valid)
+    for i, result in enumerate(results):
+        if result is None:
+            user_obj = next(valid)
+            if next(added):
+                results[i] = {"status": 201, "user": user_obj}
+            else:
+                results[i] = {"status": 409, "error": "Username already exists"}
+
+    return jsonify({"results": results})
+
+
+@app.route("/users/batch_get", methods=["POST"])
+def batch_get_users():
+    data = _parse_json()
+    if not isinstance(data, list) or not all(isinstance(name, str) for name in data):
+        return jsonify({"error": "Expected a JSON array of usernames"}), 400
+    if len(data) > MAX_BATCH_SIZE:
+        return jsonify({"error": "At most %d usernames per batch" % MAX_BATCH_SIZE}), 400
+    # unknown usernames map to null
+    return jsonify(users.get_many(data))
+
+
 # Allow running directly with `python3 task_04_flask.py`
 if __name__ == "__main__":
     # Note: in testing environment they commonly run `flask --app task_04_flask.py run`
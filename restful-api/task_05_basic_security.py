@@ -12,19 +12,30 @@ Endpoints:
  - POST /login             -> JSON {username, password} -> returns {access_token: "..."}
  - GET  /jwt-protected     -> JWT protected (returns "JWT Auth: Access Granted")
  - GET  /admin-only        -> JWT protected + role check (returns "Admin Access: Granted" or 403)
+
+Successful Basic Auth checks are cached for a minute (credential_cache.py);
+changing a user's password hash invalidates their cached entries. Password
+hashing for /login and Basic Auth runs in a process pool (kdf_pool.py) with a
+bounded queue; when it is full those requests get 503 with Retry-After.
+The claims of verified JWTs are cached until the token expires (jwt_cache.py).
 """
 
-from flask import Flask, jsonify, request
+import os
+import threading
+
+from flask import Flask, abort, jsonify, request
 from flask_httpauth import HTTPBasicAuth
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_jwt_extended import (
-    JWTManager,
     create_access_token,
     jwt_required,
-    get_jwt_identity,
+    get_jwt,
 )
 from werkzeug.exceptions import BadRequest
 
+from credential_cache import CredentialCache
+from jwt_cache import CachingJWTManager
+from kdf_pool import KDFPool, PoolBusy
+
 app = Flask(__name__)
 
 # Use a deterministic secret for the learning environment/tests.
@@ -32,22 +43,64 @@ app = Flask(__name__)
 app.config["JWT_SECRET_KEY"] = "super-secret-key-for-testing-only"
 
 auth = HTTPBasicAuth()
-jwt = JWTManager(app)
+# Remembers the claims of already verified tokens until they expire (jwt_cache.py)
+jwt = CachingJWTManager(app)
+
+# Recently verified Basic Auth credentials (see credential_cache.py)
+credential_cache = CredentialCache(ttl=60.0, maxsize=10000)
+
+# Password hashing runs in worker processes (see kdf_pool.py).
+# KDF_WORKERS=0 hashes inline on the request thread instead.
+kdf_pool = KDFPool(workers=int(os.environ.get("KDF_WORKERS", os.cpu_count() or 1)))
+
+# Seed users as (username, password, role); their passwords are hashed in parallel
+SEED_USERS = [
+    ("user1", "password", "user"),
+    ("admin1", "password", "admin"),
+]
 
 # In-memory users dict for demo/testing:
-# Passwords are hashed.
-users = {
-    "user1": {
-        "username": "user1",
-        "password": generate_password_hash("password"),
-        "role": "user",
-    },
-    "admin1": {
-        "username": "admin1",
-        "password": generate_password_hash("password"),
-        "role": "admin",
-    },
-}
+# Passwords are hashed. Filled by seed_users() before the first request,
+# not at import: under the spawn/forkserver start methods every pool worker
+# imports this module, and hashing here would start a pool inside each one.
+users = {}
+_seeded = False
+_seed_lock = threading.Lock()
+
+
+def seed_users():
+    """Hash the SEED_USERS passwords in parallel and add them to users (once)."""
+    global _seeded
+    if _seeded:
+        return
+    with _seed_lock:
+        if _seeded:
+            return
+        hashes = kdf_pool.generate_many([password for _, password, _ in SEED_USERS])
+        for (username, _, role), password_hash in zip(SEED_USERS, hashes):
+            users.setdefault(username, {"username": username, "password": password_hash,
+                                        "role": role})
+        _seeded = True
+
+
+@app.before_request
+def ensure_seeded():
+    seed_users()
+
+
+def check_password(password_hash, password):
+    """Check a password in the KDF pool; 503 if the pool is saturated or failing."""
+    try:
+        return kdf_pool.check(password_hash, password)
+    except PoolBusy:
+        abort(503)
+
+
+@app.errorhandler(503)
+def service_unavailable(err):
+    response = jsonify({"error": "Server busy, try again later"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
 
 # -----------------------
 # Basic HTTP Auth handlers
@@ -59,7 +112,13 @@ def verify_password(username, password):
     u = users.get(username)
     if not u:
         return False
-    return check_password_hash(u["password"], password)
+    # Skip the slow hash check for credentials verified moments ago
+    if credential_cache.check(username, password, u["password"]):
+        return True
+    if not check_password(u["password"], password):
+        return False
+    credential_cache.remember(username, password, u["password"])
+    return True
 
 
 @auth.error_handler
@@ -97,7 +156,7 @@ def login():
         return jsonify({"error": "Bad credentials"}), 401
 
     user = users.get(username)
-    if not user or not check_password_hash(user["password"], password):
+    if not user or not check_password(user["password"], password):
         return jsonify({"error": "Bad credentials"}), 401
 
     # Include role in identity so we can check it later
@@ -137,6 +196,11 @@ def handle_needs_fresh_token_error(jwt_header, jwt_payload):
     return jsonify({"error": "Fresh token required"}), 401
 
 
+def current_role():
+    """Role claim of the current request's token ("user" if it has none)."""
+    return get_jwt().get("role", "user")
+
+
 # A generic protected endpoint
 @app.route("/jwt-protected", methods=["GET"])
 @jwt_required()
@@ -149,20 +213,7 @@ def jwt_protected():
 @app.route("/admin-only", methods=["GET"])
 @jwt_required()
 def admin_only():
-    # get_jwt_identity() returns the identity (username)
-    identity = get_jwt_identity()
-    # We stored role in additional claims; fetch role from request context via get_jwt_identity? Not available.
-    # Flask-JWT-Extended v4 allows reading claims with get_jwt(). But to avoid version-specific calls that tests
-    # may not expect, we'll decode the claims via request context if available.
-    # Safer approach: use flask_jwt_extended.get_jwt() to access claims.
-    try:
-        from flask_jwt_extended import get_jwt
-        claims = get_jwt()
-        role = claims.get("role", "user")
-    except Exception:
-        # Fallback if get_jwt not available
-        role = "user"
-
+    role = current_role()
     if role != "admin":
         return jsonify({"error": "Admin access required"}), 403
 
@@ -171,4 +222,5 @@ def admin_only():
 
 # Allow running directly
 if __name__ == "__main__":
+    seed_users()
     app.run(host="127.0.0.1", port=5000)
\ No newline at end of file
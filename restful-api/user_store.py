@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+user_store.py
+
+Thread-safe user store used by task_04_flask.py.
+
+Users are spread over a fixed number of shards by a stable hash of the
+username. Each shard has its own lock and dict, so requests for different
+users rarely wait on each other, and add() is an atomic check-then-insert.
+
+With a data_dir the store is durable. Every shard appends the users it
+accepts to its own JSON-lines log (shard-N.log). Once that log holds
+compact_every records, the shard is written to shard-N.snapshot and the log
+is truncated. Opening the store loads each snapshot, then replays the log
+after it. A torn last line from a crash is ignored. Without a data_dir the
+store lives only in memory.
+
+Every user gets a sequence number when first added, stored with it in the
+log and snapshot, so keys() returns usernames in insertion order, also after
+a restart. Usernames are also kept in a sorted index (a list of sorted chunks), so
+page() can list them in order from any cursor, optionally by prefix, at a
+cost that depends on the page size rather than on the number of users.
+"""
+
+import bisect
+import glob
+import itertools
+import json
+import os
+import threading
+import zlib
+
+
+class _Shard:
+    def __init__(self, index, data_dir, sync):
+        self.lock = threading.Lock()
+        self.users = {}
+        self.seqs = {}  # username -> insertion sequence number
+        self.log = None
+        self.log_records = 0
+        self.sync = sync
+        if data_dir is not None:
+            self.log_path = os.path.join(data_dir, "shard-%d.log" % index)
+            self.snapshot_path = os.path.join(data_dir, "shard-%d.snapshot" % index)
+
+    def open_log(self):
+        self.log = open(self.log_path, "a", encoding="utf-8")
+
+    def append(self, *users):
+        self.log.write("".join(_record(self.seqs[user["username"]], user) for user in users))
+        self.log_records += len(users)
+        # flushed records survive a process crash; fsynced ones a power loss
+        self.log.flush()
+        if self.sync:
+            os.fsync(self.log.fileno())
+
+    def write_snapshot(self, path):
+        """Write all users to path, atomically through a .tmp file (lock held)."""
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for name, user in self.users.items():
+                f.write(_record(self.seqs[name], user))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def truncate_log(self):
+        if self.log is not None:
+            self.log.close()
+        self.log = open(self.log_path, "w", encoding="utf-8")
+        self.log_records = 0
+
+    def compact(self):
+        """Write all users to the snapshot and start an empty log (lock held)."""
+        self.write_snapshot(self.snapshot_path)
+        # the snapshot now holds everything the log did
+        self.truncate_log()
+
+
+class _SortedIndex:
+    """Sorted strings stored as a list of short sorted chunks.
+
+    Inserting shifts at most one chunk, and finding a position is a bisect
+    over the chunk maxima followed by a bisect inside one chunk.
+    """
+
+    CHUNK = 1000
+
+    def __init__(self, names=()):
+        self.lock = threading.Lock()
+        self.load(names)
+
+    def load(self, names):
+        """Replace the contents with names (any order)."""
+        names = sorted(names)
+        with self.lock:
+            self.chunks = [names[i:i + self.CHUNK]
+                           for i in range(0, len(names), self.CHUNK)]
+            self.maxes = [chunk[-1] for chunk in self.chunks]
+
+    def add(self, name):
+        with self.lock:
+            if not self.chunks:
+                self.chunks.append([name])
+                self.maxes.append(name)
+                return
+            c = min(bisect.bisect_left(self.maxes, name), len(self.chunks) - 1)
+            chunk = self.chunks[c]
+            bisect.insort(chunk, name)
+            self.maxes[c] = chunk[-1]
+            if len(chunk) > 2 * self.CHUNK:
+                self.chunks[c:c + 1] = [chunk[:self.CHUNK], chunk[self.CHUNK:]]
+                self.maxes[c:c + 1] = [chunk[self.CHUNK - 1], chunk[-1]]
+
+    def page(self, limit, after=None, prefix=""):
+        """Up to limit names greater than after that start with prefix."""
+        start = prefix if after is None or after < prefix else after
+        names = []
+        with self.lock:
+            c = bisect.bisect_left(self.maxes, start)
+            if c < len(self.chunks):
+                chunk = self.chunks[c]
+                i = (bisect.bisect_right if start == after else bisect.bisect_left)(chunk, start)
+            while c < len(self.chunks) and len(names) < limit:
+                chunk = self.chunks[c]
+                for name in chunk[i:i + limit - len(names)]:
+                    if not name.startswith(prefix):
+                        return names
+                    names.append(name)
+                c += 1
+                i = 0
+        return names
+
+
+def _record(seq, user):
+    return json.dumps([seq, user], separators=(",", ":")) + "\n"
+
+
+def _read_records(path):
+    """Yield (seq, user dict) from a snapshot/log file, stopping at a torn line."""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            try:
+                yield json.loads(line)
+            except ValueError:
+                break
+
+
+class UserStore:
+    """A dict-like map of username -> user dict; usernames are str."""
+
+    def __init__(self, data_dir=None, shards=16, compact_every=100000, sync=False):
+        """sync=True fsyncs every log append (slower, but survives power loss)."""
+        self.data_dir = data_dir
+        self.compact_every = compact_every
+        self._shards = [_Shard(i, data_dir, sync) for i in range(shards)]
+        self._index = _SortedIndex()
+        self._seq = itertools.count()
+        self._order = []  # usernames in insertion order
+        if data_dir is not None:
+            os.makedirs(data_dir, exist_ok=True)
+            self._recover()
+            # one sort after recovery instead of an insert per user
+            self._index.load(name for shard in self._shards for name in shard.users)
+
+    def _shard(self, username):
+        # crc32 rather than hash(): str hashes change between processes
+        return self._shards[zlib.crc32(str(username).encode("utf-8")) % len(self._shards)]
+
+    def _manifest_path(self):
+        return os.path.join(self.data_dir, "manifest.json")
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path(), encoding="utf-8") as f:
+                return json.load(f).get("shards")
+        except (OSError, ValueError):
+            return None
+
+    def _write_manifest(self):
+        tmp = self._manifest_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"shards": len(self._shards)}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._manifest_path())
+
+    def _files(self, index):
+        base = os.path.join(self.data_dir, "shard-%d" % index)
+        # .snapshot.new files are left by a resharding that did not finish
+        return base + ".snapshot", base + ".snapshot.new", base + ".log"
+
+    def _recover(self):
+        existing = set()
+        for path in glob.glob(os.path.join(self.data_dir, "shard-*.*")):
+            if path.endswith(".tmp"):
+                # a snapshot that was never completed
+                os.remove(path)
+                continue
+            try:
+                existing.add(int(os.path.basename(path)[6:].split(".", 1)[0]))
+            except ValueError:
+                continue
+
+        # Every file is read and each user routed by the current shard count.
+        # Any user found outside its own shard's files means the layout on
+        # disk differs from ours and has to be rewritten.
+        misplaced = False
+        for index in sorted(existing):
+            home = self._shards[index] if index < len(self._shards) else None
+            for path in self._files(index):
+                for seq, user in _read_records(path):
+                    shard = self._shard(user["username"])
+                    shard.users[user["username"]] = user
+                    shard.seqs[user["username"]] = seq
+                    if shard is not home:
+                        misplaced = True
+                    elif path.endswith(".log"):
+                        shard.log_records += 1
+
+        seqs = [(seq, name) for shard in self._shards for name, seq in shard.seqs.items()]
+        seqs.sort()
+        self._order = [name for _, name in seqs]
+        self._seq = itertools.count(seqs[-1][0] + 1 if seqs else 0)
+
+        if misplaced or self._read_manifest() != len(self._shards):
+            self._reshard(existing)
+        for shard in self._shards:
+            shard.open_log()
+
+    def _reshard(self, existing):
+        """Rewrite every shard for the current shard count."""
+        # 1. complete snapshots of the new layout, under names the old one
+        #    never reads as current
+        for shard in self._shards:
+            shard.write_snapshot(shard.snapshot_path + ".new")
+        # 2. swap them in: each user stays in at least one complete file
+        for shard in self._shards:
+            os.replace(shard.snapshot_path + ".new", shard.snapshot_path)
+        self._write_manifest()
+        # 3. the old logs and shards past the new count are now redundant
+        for shard in self._shards:
+            shard.truncate_log()
+            shard.log.close()
+            shard.log = None
+        for index in existing:
+            if index >= len(self._shards):
+                for path in self._files(index):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def add(self, user):
+        """Insert user (a dict with "username") unless it exists; return True if added."""
+        username = user["username"]
+        shard = self._shard(username)
+        with shard.lock:
+            if username in shard.users:
+                return False
+            self._insert(shard, user)
+            if shard.log is not None:
+                shard.append(user)
+            if shard.log is not None and shard.log_records >= self.compact_every:
+                shard.compact()
+        return True
+
+    def _insert(self, shard, user):
+        """Add a new user to shard and to the indexes (shard lock held)."""
+        username = user["username"]
+        shard.users[username] = user
+        shard.seqs[username] = next(self._seq)
+        self._order.append(username)
+        self._index.add(username)
+
+    def add_many(self, users):
+        """add() for a list of users; return a list of booleans in the same order.
+
+        Each shard involved is locked once for the whole batch and its log
+        gets one write. A username repeated in the batch is added only once.
+        """
+        by_shard = {}
+        for pos, user in enumerate(users):
+            by_shard.setdefault(self._shard(user["username"]), []).append(pos)
+        added = [False] * len(users)
+        for shard, positions in by_shard.items():
+            with shard.lock:
+                fresh = []
+                for pos in positions:
+                    user = users[pos]
+                    if user["username"] not in shard.users:
+                        self._insert(shard, user)
+                        fresh.append(user)
+                        added[pos] = True
+                if fresh and shard.log is not None:
+                    shard.append(*fresh)
+                    if shard.log_records >= self.compact_every:
+                        shard.compact()
+        return added
+
+    def get_many(self, usernames):
+        """Return {username: user or None} for every requested username."""
+        return {name: self._shard(name).users.get(name) for name in usernames}
+
+    def get(self, username, default=None):
+        return self._shard(username).users.get(username, default)
+
+    def __getitem__(self, username):
+        return self._shard(username).users[username]
+
+    def __setitem__(self, username, user):
+        """Insert or replace (unlike add(), which never overwrites)."""
+        if user.get("username") != username:
+            user = dict(user, username=username)
+        shard = self._shard(username)
+        with shard.lock:
+            if username in shard.users:
+                # replacing keeps the user's place in insertion order
+                shard.users[username] = user
+            else:
+                self._insert(shard, user)
+            if shard.log is not None:
+                shard.append(user)
+
+    def __contains__(self, username):
+        return username in self._shard(username).users
+
+    def __len__(self):
+        return sum(len(shard.users) for shard in self._shards)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def page(self, limit, after=None, prefix=""):
+        """Up to limit usernames in sorted order, all greater than after and
+        starting with prefix. Pass the last name of a page as the next after."""
+        return self._index.page(limit, after, prefix)
+
+    def keys(self):
+        """All usernames in insertion order (kept across restarts)."""
+        return list(self._order)
+
+    def values(self):
+        users = []
+        for shard in self._shards:
+            with shard.lock:
+                users.extend(shard.users.values())
+        return users
+
+    def items(self):
+        return [(user["username"], user) for user in self.values()]
+
+    def clear(self):
+        for shard in self._shards:
+            with shard.lock:
+                shard.users.clear()
+                shard.seqs.clear()
+                if shard.log is not None:
+                    shard.compact()
+        self._order = []
+        self._index.load(())
+
+    def compact(self):
+        """Snapshot every shard now."""
+        for shard in self._shards:
+            with shard.lock:
+                if shard.log is not None:
+                    shard.compact()
+
+    def close(self):
+        for shard in self._shards:
+            with shard.lock:
+                if shard.log is not None:
+                    shard.log.close()
+                    shard.log = None